@@ -1,2 +1,2 @@
-"""Backend API for Data Analysis Application"""
+"""Backend API for Data Analysis Application"""
 __version__ = "1.0.0"
\ No newline at end of file
@@ -0,0 +1,13 @@
+from fastapi import HTTPException, Request
+
+from app.config import settings
+from app.services.storage import StorageService
+
+def get_storage(request: Request) -> StorageService:
+    """The application's shared StorageService"""
+    return request.app.state.storage
+
+def require_openai_key(feature: str):
+    """Answer 503 when a feature that calls OpenAI is used without an API key configured"""
+    if not settings.openai_api_key:
+        raise HTTPException(503, f"{feature} needs an OpenAI API key; set OPENAI_API_KEY on the backend")
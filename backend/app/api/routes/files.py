@@ -1,167 +1,419 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, WebSocket
-from typing import List, Optional
-import pandas as pd
-import io
-import chardet
-from datetime import datetime
-import asyncio
-import json
-
-from ...services.storage import StorageService
-from ...services.clustering import ClusteringService
-from ...schema.file import FileInfo, FileUploadResponse, ClusteringRequest
-
-router = APIRouter()
-storage = StorageService()
-
-# CREATE A SINGLE INSTANCE HERE:
-clustering_service = ClusteringService()
-
-# Existing endpoints remain the same...
-
-@router.post("/upload", response_model=FileUploadResponse)
-async def upload_file(
-    file: UploadFile = File(...),
-    description: Optional[str] = Form(None)
-):
-    """Upload a CSV or Excel file"""
-    try:
-        # Validate file extension
-        if not any(file.filename.endswith(ext) for ext in ['.csv', '.xlsx']):
-            raise HTTPException(400, "Only CSV and Excel files are supported")
-        
-        # Read file content ONCE
-        content = await file.read()
-        
-        # Process based on file type
-        if file.filename.endswith('.csv'):
-            # Detect encoding
-            encoding = chardet.detect(content)['encoding'] or 'utf-8'
-            # Create DataFrame from content
-            df = pd.read_csv(io.BytesIO(content), encoding=encoding)
-        else:
-            # Excel file
-            df = pd.read_excel(io.BytesIO(content))
-        
-        # Save to storage
-        dataset_id = await storage.save_dataset(df, file.filename, description)
-        
-        return FileUploadResponse(
-            dataset_id=dataset_id,
-            filename=file.filename,
-            rows=len(df),
-            columns=len(df.columns),
-            message="File uploaded successfully"
-        )
-        
-    except Exception as e:
-        raise HTTPException(500, f"Error processing file: {str(e)}")
-
-@router.get("/list", response_model=List[FileInfo])
-async def list_files():
-    """List all uploaded files"""
-    return await storage.list_datasets()
-
-@router.get("/{dataset_id}/preview")
-async def preview_file(dataset_id: str, rows: int = 5):
-    """Preview a dataset"""
-    df = await storage.load_dataset(dataset_id)
-    if df is None:
-        raise HTTPException(404, "Dataset not found")
-    
-    return {
-        "data": df.head(rows).to_dict(orient="records"),
-        "columns": list(df.columns),
-        "dtypes": df.dtypes.astype(str).to_dict()
-    }
-
-@router.delete("/{dataset_id}")
-async def delete_file(dataset_id: str):
-    """Delete a dataset"""
-    success = await storage.delete_dataset(dataset_id)
-    if not success:
-        raise HTTPException(404, "Dataset not found")
-    
-    return {"message": "Dataset deleted successfully"}
-
-@router.get("/{dataset_id}/download")
-async def download_file(dataset_id: str):
-    """Download a dataset as CSV"""
-    df = await storage.load_dataset(dataset_id)
-    if df is None:
-        raise HTTPException(404, "Dataset not found")
-    
-    # Convert to CSV
-    csv_data = df.to_csv(index=False)
-    
-    return {
-        "content": csv_data,
-        "filename": f"{dataset_id}.csv"
-    }
-
-@router.post("/{dataset_id}/cluster")
-async def start_clustering(dataset_id: str, request: ClusteringRequest):
-    """Start clustering process for a dataset"""
-    # Verify dataset exists
-    df = await storage.load_dataset(dataset_id)
-    if df is None:
-        raise HTTPException(404, "Dataset not found")
-    
-    # Verify required columns
-    if request.description_column not in df.columns:
-        raise HTTPException(400, f"Column '{request.description_column}' not found in dataset")
-    
-    # Create task ID
-    task_id = f"cluster_{dataset_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    
-    # # Start clustering in background
-    # clustering_service = ClusteringService()
-    
-    # CRITICAL: Register the task BEFORE starting background work
-    await clustering_service.create_task(task_id, dataset_id)
-    
-    asyncio.create_task(
-        clustering_service.process_clustering(
-            task_id=task_id,
-            dataset_id=dataset_id,
-            df=df,
-            description_column=request.description_column,
-            number_column=request.number_column,
-            n_clusters=request.n_clusters
-        )
-    )
-    
-    return {
-        "task_id": task_id,
-        "message": "Clustering process started",
-        "status_endpoint": f"/api/files/cluster/status/{task_id}"
-    }
-
-@router.get("/cluster/status/{task_id}")
-async def get_clustering_status(task_id: str):
-    """Get status of clustering task"""
-    status = await clustering_service.get_task_status(task_id)
-    
-    if status is None:
-        raise HTTPException(404, "Task not found")
-    
-    return status
-
-@router.websocket("/cluster/ws/{task_id}")
-async def clustering_websocket(websocket: WebSocket, task_id: str):
-    """WebSocket for real-time clustering updates"""
-    await websocket.accept()
-    clustering_service = ClusteringService()
-    
-    try:
-        while True:
-            status = await clustering_service.get_task_status(task_id)
-            if status:
-                await websocket.send_json(status)
-                if status["status"] in ["completed", "failed"]:
-                    break
-            await asyncio.sleep(1)
-    except Exception as e:
-        await websocket.send_json({"error": str(e)})
-    finally:
-        await websocket.close()
\ No newline at end of file
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import json
+import time
+import uuid
+import zipfile
+
+from ...config import settings
+from ...services.storage import StorageService
+from ...services.clustering import ClusteringService
+from ...services.jobs import job_queue
+from ...services.ingestion import IngestionService
+from ...services.similarity import similarity_service
+from ...services.embedding_providers import EMBEDDING_PROVIDERS, get_embedding_provider
+from ...utils.text_cleaning import clean_description
+from ..dependencies import get_storage, require_openai_key
+from ...schema.file import FileInfo, FileUploadResponse, DatasetProfile, ClusteringRequest, AssignmentRequest, SimilarityRequest
+
+router = APIRouter()
+
+# CREATE A SINGLE INSTANCE HERE:
+clustering_service = ClusteringService()
+job_queue.register("clustering", clustering_service.run_job)
+job_queue.register("assignment", clustering_service.run_assignment_job)
+ingestion_service = IngestionService()
+job_queue.register("ingestion", ingestion_service.run_job, settings.max_concurrent_ingestion_jobs)
+
+# Existing endpoints remain the same...
+
+@router.post("/upload", response_model=FileUploadResponse)
+async def upload_file(
+    file: UploadFile = File(...),
+    description: Optional[str] = Form(None),
+    sheet: Optional[str] = Form(None),
+    storage: StorageService = Depends(get_storage)
+):
+    """Upload a CSV or Excel file (Excel sheets are imported by a background task)"""
+    temp_path = None
+    try:
+        # Validate file extension
+        extension = Path(file.filename).suffix.lower()
+        if extension not in settings.allowed_extensions:
+            raise HTTPException(400, "Only CSV and Excel files are supported")
+        
+        # Copy the upload to disk in chunks, enforcing the size limit as it arrives
+        temp_path = await save_upload(file, extension)
+        
+        # Process based on file type
+        if extension == '.xlsx':
+            # Check the sheet up front; reading the rows is left to the ingestion task
+            try:
+                storage.resolve_sheet(await asyncio.to_thread(storage.excel_sheet_names, temp_path), sheet)
+            except (zipfile.BadZipFile, KeyError):
+                raise HTTPException(400, "Not a valid .xlsx workbook")
+            except ValueError as e:
+                raise HTTPException(400, str(e))
+            
+            task_id = f"ingest_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            await ingestion_service.create_task(task_id, temp_path, file.filename, description, sheet)
+            temp_path = None  # owned by the task now
+            return FileUploadResponse(
+                filename=file.filename,
+                task_id=task_id,
+                message="Excel file uploaded, importing rows..."
+            )
+        
+        # Converted block by block, so memory use doesn't grow with the file
+        dataset_id, rows, columns = await storage.import_csv(temp_path, file.filename, description)
+        
+        return FileUploadResponse(
+            dataset_id=dataset_id,
+            filename=file.filename,
+            rows=rows,
+            columns=columns,
+            message="File uploaded successfully"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Error processing file: {str(e)}")
+    finally:
+        if temp_path:
+            temp_path.unlink(missing_ok=True)
+
+async def save_upload(file: UploadFile, extension: str) -> Path:
+    """Write an upload to data/temp; raises 413 once it exceeds max_upload_size"""
+    limit_mb = settings.max_upload_size / (1024 * 1024)
+    if file.size and file.size > settings.max_upload_size:
+        raise HTTPException(413, f"File exceeds the {limit_mb:.0f}MB upload limit")
+    
+    temp_path = settings.data_dir / "temp" / f"{uuid.uuid4().hex}{extension}"
+    size = 0
+    try:
+        with open(temp_path, "wb") as out:
+            while chunk := await file.read(settings.upload_chunk_size):
+                size += len(chunk)
+                if size > settings.max_upload_size:
+                    raise HTTPException(413, f"File exceeds the {limit_mb:.0f}MB upload limit")
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return temp_path
+
+@router.get("/list", response_model=List[FileInfo])
+async def list_files(storage: StorageService = Depends(get_storage)):
+    """List all uploaded files"""
+    return await storage.list_datasets()
+
+@router.get("/{dataset_id}/preview")
+async def preview_file(dataset_id: str, rows: int = Query(5, ge=0, le=settings.preview_max_rows),
+                       columns: Optional[List[str]] = Query(None),
+                       storage: StorageService = Depends(get_storage)):
+    """Preview the first rows of a dataset, optionally only some columns"""
+    try:
+        df = await storage.read_dataset_head(dataset_id, rows, columns)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if df is None:
+        raise HTTPException(404, "Dataset not found")
+    dtypes = await storage.get_dataset_schema(dataset_id)
+    
+    return {
+        "data": df.to_dict(orient="records"),
+        "columns": list(df.columns),
+        "dtypes": {column: dtypes[column] for column in df.columns}
+    }
+
+@router.get("/{dataset_id}/profile", response_model=DatasetProfile)
+async def get_profile(dataset_id: str, storage: StorageService = Depends(get_storage)):
+    """Column types, null and distinct counts, ranges, top values and text lengths of a dataset"""
+    profile = await storage.get_dataset_profile(dataset_id)
+    if profile is None:
+        raise HTTPException(404, "Dataset not found")
+    return profile
+
+def check_description_column(profile: dict, column: str):
+    """Validate a description column against a dataset's profile (no need to load the data)"""
+    columns = {c["name"]: c for c in profile["columns"]}
+    if column not in columns:
+        raise HTTPException(400, f"Column '{column}' not found in dataset")
+    if columns[column]["null_count"] == profile["rows"]:
+        raise HTTPException(400, f"Column '{column}' has no values")
+
+@router.delete("/{dataset_id}")
+async def delete_file(dataset_id: str, storage: StorageService = Depends(get_storage)):
+    """Delete a dataset"""
+    success = await storage.delete_dataset(dataset_id)
+    if not success:
+        raise HTTPException(404, "Dataset not found")
+    
+    return {"message": "Dataset deleted successfully"}
+
+# format -> (file extension, media type)
+DOWNLOAD_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrows", "application/vnd.apache.arrow.stream"),
+}
+
+@router.get("/{dataset_id}/download")
+async def download_file(dataset_id: str, format: str = "csv", compression: Optional[str] = None,
+                        storage: StorageService = Depends(get_storage)):
+    """Download a dataset as CSV, parquet or an Arrow IPC stream.
+    
+    CSV and Arrow are encoded batch by batch while the response is sent
+    (optionally gzipped); parquet is the stored file itself, with support
+    for HTTP Range requests.
+    """
+    if format not in DOWNLOAD_FORMATS:
+        raise HTTPException(400, f"Unsupported format: {format}. Use one of: {', '.join(DOWNLOAD_FORMATS)}")
+    if compression not in (None, "gzip"):
+        raise HTTPException(400, "Only gzip compression is supported")
+    file_path = await storage.get_dataset_path(dataset_id)
+    if file_path is None or not file_path.exists():
+        raise HTTPException(404, "Dataset not found")
+    
+    extension, media_type = DOWNLOAD_FORMATS[format]
+    filename = f"{dataset_id}{extension}"
+    if format == "parquet":
+        if compression:
+            raise HTTPException(400, "Parquet downloads are already compressed")
+        return FileResponse(file_path, media_type=media_type, filename=filename)
+    
+    chunks = storage.iter_csv(file_path) if format == "csv" else storage.iter_arrow_stream(file_path)
+    if compression:
+        chunks = storage.gzip_chunks(chunks)
+        filename, media_type = f"{filename}.gz", "application/gzip"
+    # A plain iterator is run in the threadpool, so encoding stays off the event loop
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/{dataset_id}/cluster")
+async def start_clustering(dataset_id: str, request: ClusteringRequest, storage: StorageService = Depends(get_storage)):
+    """Start clustering process for a dataset"""
+    # Verify dataset exists
+    profile = await storage.get_dataset_profile(dataset_id)
+    if profile is None:
+        raise HTTPException(404, "Dataset not found")
+    
+    # Verify required columns
+    check_description_column(profile, request.description_column)
+    provider = request.embedding_provider or settings.embedding_provider
+    if provider == "openai":
+        require_openai_key("Clustering with OpenAI embeddings")
+    
+    # Reduced vectors can't be wider than the embeddings they come from
+    reduction = request.reduction or settings.reduction_method
+    width = EMBEDDING_PROVIDERS[provider].native_dimensions() if provider in EMBEDDING_PROVIDERS else None
+    if reduction != "none" and request.reduced_dimensions and width and request.reduced_dimensions > width:
+        raise HTTPException(400, f"reduced_dimensions must be at most {width}, the size of '{provider}' embeddings")
+    
+    # Create task ID
+    task_id = f"cluster_{dataset_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    
+    # Persist the task; a job queue worker picks it up when a slot is free
+    await clustering_service.create_task(
+        task_id,
+        dataset_id,
+        request.model_dump()
+    )
+    
+    return {
+        "task_id": task_id,
+        "message": "Clustering task queued",
+        "status_endpoint": f"/api/files/cluster/status/{task_id}"
+    }
+
+@router.post("/{dataset_id}/assign")
+async def start_assignment(dataset_id: str, request: AssignmentRequest, storage: StorageService = Depends(get_storage)):
+    """Assign a new dataset's rows to the clusters of an earlier clustering result"""
+    profile = await storage.get_dataset_profile(dataset_id)
+    if profile is None:
+        raise HTTPException(404, "Dataset not found")
+    
+    check_description_column(profile, request.description_column)
+    
+    cluster_model = await storage.load_cluster_model(request.model_id)
+    if cluster_model is None:
+        raise HTTPException(404, f"No cluster model found for dataset '{request.model_id}'")
+    if cluster_model[1].get("embedding_provider", "openai") == "openai":
+        require_openai_key("Assigning rows with OpenAI embeddings")
+    
+    task_id = f"assign_{dataset_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    await job_queue.enqueue(task_id, "assignment", dataset_id, request.model_dump())
+    
+    return {
+        "task_id": task_id,
+        "message": "Assignment task queued",
+        "status_endpoint": f"/api/files/cluster/status/{task_id}"
+    }
+
+@router.get("/{dataset_id}/cluster-model")
+async def get_cluster_model(dataset_id: str, storage: StorageService = Depends(get_storage)):
+    """Describe the cluster model saved with a clustering result"""
+    cluster_model = await storage.load_cluster_model(dataset_id)
+    if cluster_model is None:
+        raise HTTPException(404, "No cluster model found for this dataset")
+    
+    model, metadata = cluster_model
+    return {
+        **metadata,
+        "dimensions": int(model["centroids"].shape[1]),
+        "outlier_radii": model["radii"].tolist()
+    }
+
+@router.post("/{dataset_id}/similar")
+async def find_similar(dataset_id: str, request: SimilarityRequest, storage: StorageService = Depends(get_storage)):
+    """Find the tickets most similar to a free-text query or to a ticket of the dataset"""
+    if (request.text is None) == (request.ticket_id is None):
+        raise HTTPException(400, "Provide either 'text' or 'ticket_id'")
+    
+    start = time.perf_counter()
+    index = await similarity_service.get_index(dataset_id)
+    if index is None:
+        raise HTTPException(404, "Dataset not found or has no embeddings (cluster it first)")
+    
+    exclude_row = None
+    if request.ticket_id is not None:
+        try:
+            exclude_row = await similarity_service.find_row(dataset_id, index, request.id_column, request.ticket_id)
+        except KeyError:
+            raise HTTPException(400, f"Column '{request.id_column}' not found in dataset")
+        if exclude_row is None:
+            raise HTTPException(404, f"Ticket '{request.ticket_id}' not found")
+        query = (await storage.load_embeddings(dataset_id))[exclude_row]
+    else:
+        text = clean_description(request.text)
+        if not text:
+            raise HTTPException(400, "Query text is empty after cleaning")
+        # Embed the query like the dataset was embedded (same provider, shortened embeddings keep their size)
+        cluster_model = await storage.load_cluster_model(dataset_id)
+        metadata = cluster_model[1] if cluster_model else {}
+        if (metadata.get("embedding_provider") or settings.embedding_provider) == "openai":
+            require_openai_key("Searching by text with OpenAI embeddings")
+        provider = get_embedding_provider(metadata.get("embedding_provider"))
+        query = await clustering_service.embed_query(text, metadata.get("embedding_dimensions"), provider)
+        if len(query) != index.vectors.shape[1]:
+            raise HTTPException(400, "Query embedding size doesn't match the dataset's embeddings")
+    
+    try:
+        results = await similarity_service.search(
+            dataset_id, index, query, request.id_column, request.top_k, request.nprobe, exclude_row
+        )
+    except KeyError:
+        raise HTTPException(400, f"Column '{request.id_column}' not found in dataset")
+    
+    return {
+        "dataset_id": dataset_id,
+        "query": request.ticket_id if request.ticket_id is not None else text,
+        "results": results,
+        "took_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+@router.post("/{dataset_id}/similar/index")
+async def build_similarity_index(dataset_id: str):
+    """(Re)build a dataset's similarity index from its stored embeddings"""
+    n_lists = await similarity_service.build_index(dataset_id)
+    if n_lists is None:
+        raise HTTPException(404, "Dataset not found or has no embeddings (cluster it first)")
+    
+    return {"dataset_id": dataset_id, "lists": n_lists, "message": "Similarity index built"}
+
+@router.get("/cluster/jobs")
+async def list_clustering_jobs(status: Optional[str] = None, limit: int = 100):
+    """List recent clustering tasks"""
+    return await job_queue.list_jobs(status, limit)
+
+@router.get("/cluster/status/{task_id}")
+async def get_clustering_status(task_id: str):
+    """Get status of clustering task"""
+    status = await clustering_service.get_task_status(task_id)
+    
+    if status is None:
+        raise HTTPException(404, "Task not found")
+    
+    return status
+
+@router.post("/cluster/{task_id}/cancel")
+async def cancel_clustering(task_id: str):
+    """Cancel a queued or running clustering task"""
+    status = await job_queue.cancel(task_id)
+    if status is None:
+        raise HTTPException(404, "Task not found")
+    
+    return status
+
+def check_upload_available(status: Dict[str, Any]):
+    """Ingestion tasks can only run again while their uploaded file is still there"""
+    if status["job_type"] == "ingestion" and not Path(status["params"]["path"]).exists():
+        raise HTTPException(409, "The uploaded file is no longer available, please upload it again")
+
+@router.post("/cluster/{task_id}/retry")
+async def retry_clustering(task_id: str):
+    """Re-queue a failed or cancelled clustering task"""
+    status = await job_queue.get(task_id)
+    if status is None:
+        raise HTTPException(404, "Task not found")
+    if status["status"] not in ("failed", "cancelled"):
+        raise HTTPException(409, f"Only failed or cancelled tasks can be retried (task is {status['status']})")
+    check_upload_available(status)
+    
+    # A retry starts over; use resume to keep finished stages
+    clustering_service.checkpoints.clear(task_id)
+    return await job_queue.retry(task_id)
+
+@router.post("/cluster/{task_id}/resume")
+async def resume_clustering(task_id: str):
+    """Re-queue a failed or cancelled clustering task, continuing from its last finished stage"""
+    status = await job_queue.get(task_id)
+    if status is None:
+        raise HTTPException(404, "Task not found")
+    if status["status"] not in ("failed", "cancelled"):
+        raise HTTPException(409, f"Only failed or cancelled tasks can be resumed (task is {status['status']})")
+    check_upload_available(status)
+    
+    return await job_queue.retry(task_id, "Task re-queued to resume from its last checkpoint...")
+
+@router.websocket("/cluster/ws/{task_id}")
+async def clustering_websocket(websocket: WebSocket, task_id: str):
+    """WebSocket for real-time clustering updates"""
+    await websocket.accept()
+    
+    try:
+        if await job_queue.get(task_id) is None:
+            raise ValueError("Task not found")
+        # Updates are pushed as the task publishes them; no per-client polling
+        async for status in job_queue.watch(task_id):
+            await websocket.send_json(status)
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        await websocket.send_json({"error": str(e)})
+    
+    await websocket.close()
+
+@router.get("/cluster/events/{task_id}")
+async def clustering_events(task_id: str):
+    """Server-Sent Events stream of clustering updates, ending when the task finishes"""
+    if await job_queue.get(task_id) is None:
+        raise HTTPException(404, "Task not found")
+    
+    async def event_stream():
+        async for status in job_queue.watch(task_id):
+            yield f"data: {json.dumps(status)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
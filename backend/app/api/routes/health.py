@@ -1,24 +1,30 @@
-from fastapi import APIRouter
-from datetime import datetime
-from app.config import settings
-
-router = APIRouter()
-
-@router.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "version": settings.api_version,
-        "message": "Backend is working properly!"
-    }
-
-@router.get("/")
-async def root():
-    """Root endpoint"""
-    return {
-        "message": "Data Analysis API is running!",
-        "docs": "/docs",
-        "health": "/health"
+from fastapi import APIRouter
+from datetime import datetime
+from app.config import settings
+from app.services.dataset_cache import dataset_cache
+
+router = APIRouter()
+
+@router.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "version": settings.api_version,
+        "message": "Backend is working properly!"
+    }
+
+@router.get("/health/cache")
+async def cache_stats():
+    """Dataset cache size and hit/miss/eviction counters of this API process"""
+    return dataset_cache.stats()
+
+@router.get("/")
+async def root():
+    """Root endpoint"""
+    return {
+        "message": "Data Analysis API is running!",
+        "docs": "/docs",
+        "health": "/health"
     }
\ No newline at end of file
@@ -1,41 +1,117 @@
-import os
-from typing import List
-from pydantic_settings import BaseSettings
-from pathlib import Path
-
-class Settings(BaseSettings):
-    # API Settings
-    api_host: str = "0.0.0.0"
-    api_port: int = 8000
-    api_reload: bool = True
-    api_title: str = "Data Analysis API"
-    api_version: str = "1.0.0"
-    
-    # Database
-    database_url: str = "sqlite+aiosqlite:///./data/app.db"
-    data_dir: Path = Path("./data")
-    
-
-    # OpenAI
-    openai_api_key: str
-    
-    # Security
-    secret_key: str = "Josue"
-    cors_origins: List[str] = ["http://localhost:8501"]
-    
-    # File Upload
-    max_upload_size: int = 100 * 1024 * 1024  # 100MB
-    allowed_extensions: List[str] = [".csv", ".xlsx"]
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
-
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Ensure data directory exists
-        self.data_dir.mkdir(exist_ok=True)
-        (self.data_dir / "datasets").mkdir(exist_ok=True)
-        (self.data_dir / "temp").mkdir(exist_ok=True)
-
+import os
+from typing import List
+from pydantic_settings import BaseSettings
+from pathlib import Path
+
+class Settings(BaseSettings):
+    # API Settings
+    api_host: str = "0.0.0.0"
+    api_port: int = 8000
+    api_reload: bool = True
+    api_title: str = "Data Analysis API"
+    api_version: str = "1.0.0"
+    
+    # Database
+    database_url: str = "sqlite+aiosqlite:///./data/app.db"
+    data_dir: Path = Path("./data")
+    
+
+    # OpenAI
+    openai_api_key: str = ""  # without a key, chat and OpenAI embeddings answer 503; cluster summaries are built locally from keywords
+    embedding_model: str = "text-embedding-3-small"
+    
+    # Embeddings
+    embedding_provider: str = "openai"  # "openai" or "hashing" (local, offline)
+    local_embedding_dimensions: int = 512  # vector size of the hashing provider
+    
+    # Clustering
+    text_cleaning_mode: str = "vectorized"  # "vectorized" or "apply" (row-by-row reference path)
+    clustering_workers: int = 2  # processes for KMeans / silhouette search
+    k_selection_mode: str = "fast"  # "fast" (MiniBatchKMeans on a subsample) or "exhaustive"
+    k_selection_criterion: str = "silhouette"  # "silhouette", "calinski_harabasz" or "elbow"
+    k_selection_sample_size: int = 20000
+    reduction_method: str = "none"  # "none", "pca", "svd" or "api" (shorter embeddings from the model)
+    reduced_dimensions: int = 256
+    summary_model: str = "gpt-4o-mini"
+    summary_sample_size: int = 40  # distinct descriptions nearest the centroid sent per cluster
+    summary_cache_enabled: bool = True
+    summary_concurrency: int = 5  # LLM cluster summaries in flight
+    summary_timeout: float = 120  # seconds per summary call
+    summary_max_retries: int = 2  # per summary call, on rate limits and transient API errors
+    outlier_quantile: float = 0.99  # assigned rows farther from their centroid than this share of its members are outliers
+    
+    # Similarity search
+    similarity_list_size: int = 4096  # target rows per IVF list; clusters are split into lists of about this size
+    similarity_nprobe: int = 8  # lists scanned per query (more = better recall, slower)
+    similarity_exact_max_rows: int = 50_000  # smaller datasets are searched exhaustively
+    similarity_block_rows: int = 65536  # rows scored per matrix-vector product
+    similarity_max_open_indexes: int = 8  # indexes kept open per process; the least recently used are closed first
+    
+    # Job queue
+    max_concurrent_jobs: int = 2  # across all API worker processes
+    max_concurrent_ingestion_jobs: int = 1  # Excel imports, limited separately from clustering jobs
+    job_poll_interval: float = 2.0  # seconds between checks for jobs queued by other processes
+    job_heartbeat_interval: float = 30.0
+    job_stale_after: float = 300.0  # running jobs without a heartbeat for this long are re-queued
+    job_max_attempts: int = 3  # interrupted jobs are re-queued until they have been started this many times
+    task_event_fallback_interval: float = 5.0  # seconds between status re-reads for progress streams
+    checkpoint_retention_hours: float = 72  # stage checkpoints and uploads of unfinished tasks are kept this long for resume
+    
+    # Embedding throughput (shared across all clustering tasks)
+    embedding_concurrency: int = 4  # batches in flight
+    embedding_rpm: int = 3000  # requests per minute
+    embedding_tpm: int = 1_000_000  # tokens per minute
+    embedding_max_retries: int = 5
+    embedding_batch_max_items: int = 1024  # inputs per request (API hard limit is 2048)
+    embedding_batch_max_tokens: int = 100_000  # tokens per request (API hard limit is 300k)
+    tokenizer_threads: int = 8
+    
+    # SQLite
+    sqlite_readers: int = 4  # pooled read-only connections
+    sqlite_busy_timeout_ms: int = 5000  # wait for locks held by other processes
+    sqlite_cache_kb: int = 8192  # page cache per connection
+    sqlite_cached_statements: int = 256  # prepared statements kept per connection
+    
+    # Embedding cache
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_mb: float = 1024  # LRU eviction above this size
+    
+    # Dataset cache (decoded DataFrames kept in memory by each API process)
+    dataset_cache_enabled: bool = True
+    dataset_cache_max_mb: float = 2048  # in-memory size; least recently used datasets are evicted above this
+    
+    # Dataset profiles (computed when a dataset is saved)
+    profile_sketch_size: int = 2048  # hashes kept per column; distinct counts are exact below this (~2% error above)
+    profile_top_values: int = 10
+    profile_top_candidates: int = 1000  # values tracked per column while counting top values
+    
+    # Security
+    secret_key: str = "Josue"
+    cors_origins: List[str] = ["http://localhost:8501"]
+    
+    # File Upload
+    max_upload_size: int = 100 * 1024 * 1024  # 100MB
+    upload_chunk_size: int = 1024 * 1024  # bytes copied from the request at a time
+    upload_encoding_sample_size: int = 256 * 1024  # leading bytes used to detect a CSV's encoding
+    csv_block_size: int = 1024 * 1024  # CSV bytes parsed at a time (pyarrow reads a few dozen blocks ahead)
+    parquet_row_group_mb: int = 32  # in-memory size of each row group written from an upload
+    excel_batch_rows: int = 50_000  # sheet rows per parquet row group (and progress update)
+    allowed_extensions: List[str] = [".csv", ".xlsx"]
+    preview_max_rows: int = 1000  # rows returned by the preview endpoint
+    download_batch_rows: int = 20_000  # rows encoded at a time by streaming downloads
+    download_gzip_level: int = 6
+    
+    class Config:
+        env_file = ".env"
+        case_sensitive = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Ensure data directory exists
+        self.data_dir.mkdir(exist_ok=True)
+        (self.data_dir / "datasets").mkdir(exist_ok=True)
+        (self.data_dir / "temp").mkdir(exist_ok=True)
+        (self.data_dir / "cache").mkdir(exist_ok=True)
+        (self.data_dir / "checkpoints").mkdir(exist_ok=True)
+
 settings = Settings()
\ No newline at end of file
@@ -1,32 +1,80 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional, Literal
-
-class FileInfo(BaseModel):
-    dataset_id: str
-    filename: str
-    upload_date: datetime
-    rows: int
-    columns: int
-    size_mb: float
-    description: Optional[str] = None
-
-class FileUploadResponse(BaseModel):
-    dataset_id: str
-    filename: str
-    rows: int
-    columns: int
-    message: str
-
-class ClusteringRequest(BaseModel):
-    description_column: str
-    number_column: Optional[str] = None
-    n_clusters: int = 0  # 0 means auto-detect
-
-class ClusteringStatus(BaseModel):
-    task_id: str
-    status: Literal["processing", "completed", "failed"]
-    progress: int  # 0-100
-    message: str
-    result: Optional[str] = None  # dataset_id of result
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional, Literal, Dict, Any, List
+
+class FileInfo(BaseModel):
+    dataset_id: str
+    filename: str
+    upload_date: datetime
+    rows: int
+    columns: int
+    size_mb: float
+    description: Optional[str] = None
+
+class ColumnProfile(BaseModel):
+    name: str
+    dtype: str  # pandas dtype
+    arrow_type: str
+    null_count: int
+    distinct_count: Optional[int] = None  # None for nested values (lists, structs)
+    distinct_exact: bool = True  # False when estimated from the distinct-count sketch
+    min: Optional[Any] = None
+    max: Optional[Any] = None
+    mean: Optional[float] = None  # numeric columns
+    std: Optional[float] = None
+    top_values: List[Dict[str, Any]] = []  # [{"value", "count"}], most frequent first
+    text_length: Optional[Dict[str, Any]] = None  # min/max/mean characters of text columns
+
+class DatasetProfile(BaseModel):
+    version: int
+    rows: int
+    row_groups: int
+    columns: List[ColumnProfile]
+    computed_at: datetime
+    seconds: float  # time taken to compute the profile
+
+class FileUploadResponse(BaseModel):
+    dataset_id: Optional[str] = None  # None while an ingestion task is still importing the file
+    filename: str
+    rows: int = 0
+    columns: int = 0
+    message: str
+    task_id: Optional[str] = None  # ingestion task for Excel uploads; its result is the dataset_id
+
+class ClusteringRequest(BaseModel):
+    description_column: str
+    number_column: Optional[str] = None
+    n_clusters: int = 0  # 0 means auto-detect
+    k_selection: Optional[Literal["fast", "exhaustive"]] = None  # None uses server default
+    k_criterion: Optional[Literal["silhouette", "calinski_harabasz", "elbow"]] = None
+    reduction: Optional[Literal["none", "pca", "svd", "api"]] = None
+    reduced_dimensions: Optional[int] = Field(None, gt=0)  # None uses server default
+    embedding_provider: Optional[Literal["openai", "hashing"]] = None  # None uses server default
+
+class AssignmentRequest(BaseModel):
+    model_id: str  # dataset_id of a clustering result with a saved cluster model
+    description_column: str
+    number_column: Optional[str] = None
+    max_distance: Optional[float] = None  # None uses each cluster's outlier radius
+
+class SimilarityRequest(BaseModel):
+    text: Optional[str] = None  # free-text query...
+    ticket_id: Optional[str] = None  # ...or the id of a ticket in the dataset
+    id_column: str = "number"
+    top_k: int = Field(10, ge=1, le=100)
+    nprobe: Optional[int] = Field(None, ge=1)  # None uses server default
+
+class ClusteringStatus(BaseModel):
+    task_id: str
+    status: Literal["pending", "processing", "completed", "failed", "cancelled"]
+    progress: int  # 0-100
+    message: str
+    result: Optional[str] = None  # dataset_id of result
+    details: Optional[Dict[str, Any]] = None  # run summary, e.g. n_clusters and explained variance
+    metrics: Optional[Dict[str, Any]] = None  # per-stage wall/CPU time, peak RSS, API calls, tokens, retries
+    dataset_id: Optional[str] = None
+    attempts: int = 0
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
     timestamp: datetime
\ No newline at end of file
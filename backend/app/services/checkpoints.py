@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class CheckpointStore:
+    """Per-task stage outputs on disk, so a failed or interrupted job can resume.
+
+    Each task gets data/checkpoints/<task_id>/ holding a manifest of the run
+    parameters plus one file per finished stage. Files are written to a temp
+    name and renamed, so a crash never leaves a half-written checkpoint behind.
+    """
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = root or settings.data_dir / "checkpoints"
+
+    def task_dir(self, task_id: str) -> Path:
+        """Directory holding a task's checkpoints"""
+        return self.root / task_id
+
+    def _path(self, task_id: str, name: str) -> Path:
+        return self.task_dir(task_id) / name
+
+    def begin(self, task_id: str, manifest: Dict[str, Any]) -> bool:
+        """Start or continue a task's checkpoints.
+
+        Returns True if checkpoints from an earlier run with the same parameters
+        exist; checkpoints written with different parameters are discarded.
+        """
+        existing = self.load_json(task_id, "manifest")
+        if existing is not None and existing == manifest:
+            return True
+        if existing is not None:
+            logger.info(f"Task {task_id}: parameters changed, discarding old checkpoints")
+            self.clear(task_id)
+
+        self.task_dir(task_id).mkdir(parents=True, exist_ok=True)
+        self.save_json(task_id, "manifest", manifest)
+        return False
+
+    # ----- Stage files -----
+
+    def save_frame(self, task_id: str, name: str, df: pd.DataFrame):
+        """Checkpoint a DataFrame as parquet"""
+        path = self._path(task_id, f"{name}.parquet")
+        tmp_path = path.with_suffix(".tmp")
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def load_frame(self, task_id: str, name: str) -> Optional[pd.DataFrame]:
+        """Load a checkpointed DataFrame, or None if the stage hasn't finished"""
+        path = self._path(task_id, f"{name}.parquet")
+        return pd.read_parquet(path) if path.exists() else None
+
+    def save_array(self, task_id: str, name: str, array: np.ndarray):
+        """Checkpoint a numpy array as .npy"""
+        path = self._path(task_id, f"{name}.npy")
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    def load_array(self, task_id: str, name: str) -> Optional[np.ndarray]:
+        """Load a checkpointed array, or None if the stage hasn't finished"""
+        path = self._path(task_id, f"{name}.npy")
+        return np.load(path) if path.exists() else None
+
+    def save_arrays(self, task_id: str, name: str, arrays: Dict[str, np.ndarray]):
+        """Checkpoint several named arrays as one .npz"""
+        path = self._path(task_id, f"{name}.npz")
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def load_arrays(self, task_id: str, name: str) -> Optional[Dict[str, np.ndarray]]:
+        """Load checkpointed named arrays, or None if the stage hasn't finished"""
+        path = self._path(task_id, f"{name}.npz")
+        if not path.exists():
+            return None
+        with np.load(path) as npz:
+            return {key: npz[key] for key in npz.files}
+
+    def save_json(self, task_id: str, name: str, data: Any):
+        """Checkpoint a JSON-serializable value"""
+        path = self._path(task_id, f"{name}.json")
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def load_json(self, task_id: str, name: str) -> Optional[Any]:
+        """Load a checkpointed JSON value, or None if the stage hasn't finished"""
+        path = self._path(task_id, f"{name}.json")
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+    # ----- Housekeeping -----
+
+    def clear(self, task_id: str):
+        """Remove all checkpoints of a task"""
+        shutil.rmtree(self.task_dir(task_id), ignore_errors=True)
+
+    def prune(self, max_age_hours: Optional[float] = None) -> int:
+        """Remove checkpoints of tasks that haven't been touched for max_age_hours"""
+        max_age_hours = settings.checkpoint_retention_hours if max_age_hours is None else max_age_hours
+        if not self.root.exists():
+            return 0
+
+        cutoff = time.time() - max_age_hours * 3600
+        removed = 0
+        for task_dir in self.root.iterdir():
+            if task_dir.is_dir() and task_dir.stat().st_mtime < cutoff:
+                shutil.rmtree(task_dir, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Pruned checkpoints of {removed} old task(s)")
+        return removed
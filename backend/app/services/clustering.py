@@ -1,356 +1,713 @@
-import pandas as pd
-import numpy as np
-import re
-import random
-import asyncio
-import logging
-from typing import Optional, Dict, Any
-from datetime import datetime
-import tiktoken
-from openai import AsyncOpenAI
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import normalize
-from sklearn.metrics import silhouette_score
-from sklearn.utils import resample
-from tqdm import tqdm
-
-from app.config import settings
-from app.services.storage import StorageService
-
-logger = logging.getLogger(__name__)
-
-class ClusteringService:
-    def __init__(self):
-        self.storage = StorageService()
-        self.tasks: Dict[str, Dict[str, Any]] = {}
-        self.encoding = tiktoken.encoding_for_model("text-embedding-3-small")
-        self.MAX_TOKENS = 8000
-        # Initialize AsyncOpenAI client with new interface
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
-        
-    # ADD THIS METHOD:
-    async def create_task(self, task_id: str, dataset_id: str) -> Dict[str, Any]:
-        """Create and register a new clustering task"""
-        task_info = {
-            "task_id": task_id,
-            "status": "pending",
-            "progress": 0,
-            "message": "Task created, preparing to start clustering...",
-            "result": None,
-            "timestamp": datetime.now().isoformat(),
-            "dataset_id": dataset_id
-        }
-        
-        # Register task immediately
-        self.tasks[task_id] = task_info
-        logger.info(f"Task {task_id} registered successfully")
-        return task_info    
-    
-    
-    async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """Get status of a clustering task"""
-        task = self.tasks.get(task_id)
-        if task:
-            logger.debug(f"Task {task_id} found - status: {task['status']}")
-        else:
-            logger.warning(f"Task {task_id} NOT FOUND. Available tasks: {list(self.tasks.keys())}")
-        return task
-    
-    async def update_task_status(self, task_id: str, status: str, progress: int, 
-                                message: str, result: Optional[str] = None):
-        """Update task status"""
-        self.tasks[task_id] = {
-            "task_id": task_id,
-            "status": status,
-            "progress": progress,
-            "message": message,
-            "result": result,
-            "timestamp": datetime.now().isoformat()
-        }
-    
-    def clean_description(self, text: str) -> str:
-        """Clean text description"""
-        text = str(text).lower()
-        # Remove URLs
-        text = re.sub(r'https?://\S+', '', text)
-        # Remove line breaks / tabs
-        text = re.sub(r'[\r\n\t]', ' ', text)
-        # Remove words with digits (e.g. device codes)
-        text = re.sub(r'\b\w*\d\w*\b', ' ', text)
-        # Remove all remaining non-alphanumerics
-        text = re.sub(r'[^a-z ]+', ' ', text)
-        # Collapse multiple spaces
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
-    
-    def count_tokens(self, texts):
-        """Count tokens in texts"""
-        return sum(len(self.encoding.encode(t)) for t in texts)
-    
-    async def calculate_optimal_batch_size(self, texts):
-        """Calculate optimal batch size based on token analysis"""
-        # Sample texts to estimate average tokens
-        sample_size = min(100, len(texts))
-        sample_texts = texts[:sample_size]
-        
-        # Calculate average tokens per text
-        total_tokens = sum(len(self.encoding.encode(text)) for text in sample_texts)
-        avg_tokens_per_text = total_tokens / len(sample_texts)
-        
-        # Calculate safe batch size (leave 10% buffer)
-        safe_batch_size = int((self.MAX_TOKENS * 0.9) / avg_tokens_per_text)
-        
-        # Ensure reasonable bounds
-        batch_size = max(1, min(safe_batch_size, 50))  # Between 1-50 texts per batch
-        
-        logger.info(f"Calculated optimal batch size: {batch_size} (avg tokens per text: {avg_tokens_per_text:.1f})")
-        return batch_size
-    
-    async def embed_batch(self, texts, model="text-embedding-3-small", retries=2):
-        """Embed a batch of texts"""
-        # filter empty
-        texts = [t if t is not None else "" for t in texts]
-        # if too many tokens, split (this should rarely happen now)
-        if self.count_tokens(texts) > self.MAX_TOKENS and len(texts) > 1:
-            mid = len(texts) // 2
-            emb1 = await self.embed_batch(texts[:mid], model)
-            emb2 = await self.embed_batch(texts[mid:], model)
-            return emb1 + emb2
-        
-        # try embedding
-        for attempt in range(retries + 1):
-            try:
-                # Add small delay to respect rate limits
-                if attempt > 0:
-                    await asyncio.sleep(0.5)
-                
-                # Use new OpenAI 1.0+ interface
-                response = await self.client.embeddings.create(
-                    model=model,
-                    input=texts
-                )
-                return [embedding.embedding for embedding in response.data]
-            except Exception as e:
-                if attempt < retries and len(texts) > 1:
-                    try:
-                        mid = len(texts) // 2
-                        emb1 = await self.embed_batch(texts[:mid], model, retries)
-                        emb2 = await self.embed_batch(texts[mid:], model, retries)
-                        return emb1 + emb2
-                    except Exception:
-                        pass
-                wait = 2 ** attempt
-                logger.warning(f"[Attempt {attempt+1}] Error: {e}. Retrying in {wait}s...")
-                if attempt < retries:
-                    await asyncio.sleep(wait)
-        
-        raise RuntimeError(f"Batch embedding failed for {len(texts)} texts after {retries + 1} attempts")
-    
-    async def categorize_and_explain_cluster(self, records):
-        """Generate cluster title and explanation using LLM"""
-        sample_size = min(40, len(records))
-        random_sample = random.sample(records, sample_size)
-        text_sample = "\n".join(f"ID {r['number']}: {r['clean_desc']}" for r in random_sample)
-        total_records = len(records)
-        
-        system_prompt = (
-            "You are **ClusterNameBot**, an Business Consulting Assistant for ServiceNow.\n\n"  
-            "Your job is to look at a batch of ticket descriptions all belonging to the same cluster and give that cluster.\n\n"
-            "Please do the following:\n"
-            "1. Assign a **short, descriptive title** for this cluster (2-5 words max).\n"
-            "2. Do not use markdown just simple text.\n"
-            "3. Give a brief explanation of **why** you chose this title, highlighting any recurring themes, language or keywords.\n\n"
-            "Avoid generic names like 'Cluster 1' or 'Miscellaneous'. Make the title informative.\n\n"
-            "Avoid duplicates titles names. Make the title informative.\n\n"
-            "Format your output as:\n"
-            "Title: <your title>\n"
-            "Explanation: <your reasoning>\n"
-            "Detailed Analysis: <common pain points and relationships>\n"
-            "Five Top Issues: <reason with context given by the examples>"
-        )
-
-        user_prompt = (
-            f"Total records received: {total_records}.\n\n"
-            "Here are sample Records (Incident ID and description) from a single cluster:\n\n"
-            f"{text_sample}\n\n"
-            "Where possible, include in your explanation references to the incident IDs to indicate the source of your insights."
-        )
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        # Use new OpenAI 1.0+ interface
-        response = await self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.3
-        )
-        
-        return response.choices[0].message.content
-    
-    async def process_clustering(self, task_id: str, dataset_id: str, df: pd.DataFrame,
-                               description_column: str, number_column: Optional[str],
-                               n_clusters: int = 5):
-        """Main clustering process"""
-        try:
-            # Step 1: Clean descriptions
-            await self.update_task_status(task_id, "processing", 10, "Starting clustering analysis......")
-            logger.info(f"Task {task_id}: Starting clustering for dataset {dataset_id}")
-            
-            df['clean_desc'] = df[description_column].apply(self.clean_description)
-            df_clean = df.drop(columns=[description_column])
-            
-            # Drop empty descriptions
-            mask = df_clean['clean_desc'].astype(str).str.strip() != ""
-            df_clean = df_clean.loc[mask].reset_index(drop=True)
-            
-            # Step 2: Generate embeddings
-            await self.update_task_status(task_id, "processing", 10, "Generating embeddings...")
-            texts = df_clean['clean_desc'].tolist()
-            # FIX: Calculate optimal batch size based on actual token counts
-            batch_size = await self.calculate_optimal_batch_size(texts)
-            all_embeddings = []
-            
-            total_batches = (len(texts) + batch_size - 1) // batch_size
-            processed_batches = 0
-            
-            for start in range(0, len(texts), batch_size):
-                batch = texts[start: start + batch_size]
-                try:
-                    embs = await self.embed_batch(batch)
-                    all_embeddings.extend(embs)
-                    logger.info(f"Successfully processed batch {processed_batches + 1}/{total_batches} with {len(batch)} texts")
-                except Exception as e:
-                    logger.error(f"Batch embedding failed: {e}")
-                    # Use zero vectors as fallback
-                    dim = len(all_embeddings[0]) if all_embeddings else 1536
-                    all_embeddings.extend([[0.0] * dim for _ in batch])
-                
-                processed_batches += 1
-                progress = 30 + int((processed_batches / total_batches) * 40)
-                await self.update_task_status(
-                    task_id, "processing", progress,
-                    f"Generating embeddings... {processed_batches}/{total_batches} batches"
-                )
-            
-            df_clean['embedding'] = all_embeddings
-            
-            # Step 3: Clustering
-            await self.update_task_status(task_id, "processing", 65, "Performing clustering...")
-            X = np.vstack(df_clean['embedding'].values)
-            X_norm = normalize(X, norm='l2')
-            
-            # Find optimal clusters using silhouette score
-            if n_clusters == 0:  # Auto-detect
-                await self.update_task_status(task_id, "processing", 70, "Finding optimal clusters...")
-                sil_scores = []
-                sample_size = min(5000, len(X_norm))
-                
-                for k in range(2, min(11, len(X_norm))):
-                    km = KMeans(n_clusters=k, random_state=42, n_init=10)
-                    labels = km.fit_predict(X_norm)
-                    
-                    X_sample, labels_sample = resample(X_norm, labels, n_samples=sample_size, random_state=42)
-                    score = silhouette_score(X_sample, labels_sample)
-                    sil_scores.append((k, score))
-                
-                # Choose k with highest silhouette score
-                n_clusters = max(sil_scores, key=lambda x: x[1])[0]
-                logger.info(f"Auto-detected optimal clusters: {n_clusters}")
-            
-            # Perform final clustering
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-            labels = kmeans.fit_predict(X_norm)
-            df_clean['cluster'] = labels
-            
-            ## Step 4: Save intermediate clustering data as parquet to preserve data types
-            await self.update_task_status(task_id, "processing", 75, "Saving intermediate clustering data...")
-            
-            # Generate intermediate parquet filename
-            original_filename = await self.storage.get_dataset_filename(dataset_id)
-            intermediate_filename = f"clustering_intermediate_{original_filename.replace('.csv', '.parquet')}"
-            
-            # Save as parquet to preserve embeddings and cluster data
-            parquet_path = f"data/{intermediate_filename}"
-            df_clean.to_parquet(parquet_path, index=False)
-            logger.info(f"Saved intermediate clustering data to {parquet_path}")
-            
-            # Step 5: Generate cluster explanations
-            await self.update_task_status(task_id, "processing", 80, "Generating cluster insights...")
-            
-            # Use number_column if provided, otherwise use index
-            if number_column and number_column in df_clean.columns:
-                id_column = number_column
-            else:
-                df_clean['number'] = df_clean.index
-                id_column = 'number'
-            
-            cluster_summaries = {}
-            total_clusters = len(df_clean['cluster'].unique())
-            processed_clusters = 0
-            
-            for cluster_label in sorted(df_clean['cluster'].unique()):
-                records = df_clean[df_clean['cluster'] == cluster_label][[id_column, 'clean_desc']].to_dict('records')
-                summary_text = await self.categorize_and_explain_cluster(records)
-                
-                # Parse response
-                title_match = re.search(r'Title:\s*(.*?)\n', summary_text)
-                explanation_match = re.search(r'Explanation:\s*(.*?)(?=\n(?:Detailed Analysis:|Five Top Issues:|$))', 
-                                            summary_text, re.DOTALL)
-                detailed_match = re.search(r'Detailed Analysis:\s*(.*?)(?=\n(?:Five Top Issues:|$))', 
-                                         summary_text, re.DOTALL)
-                issues_match = re.search(r'Five Top Issues:\s*(.*)', summary_text, re.DOTALL)
-                
-                cluster_summaries[cluster_label] = {
-                    'title': title_match.group(1).strip() if title_match else f'Cluster {cluster_label}',
-                    'explanation': explanation_match.group(1).strip() if explanation_match else 'N/A',
-                    'detailed_analysis': detailed_match.group(1).strip() if detailed_match else 'N/A',
-                    'Five_Top_Issues': issues_match.group(1).strip() if issues_match else 'N/A'
-                }
-                
-                processed_clusters += 1
-                progress = 80 + int((processed_clusters / total_clusters) * 15)
-                await self.update_task_status(
-                    task_id, "processing", progress,
-                    f"Analyzing clusters... {processed_clusters}/{total_clusters}"
-                )
-            
-            # Map summaries back to dataframe
-            df_clean['cluster_title'] = df_clean['cluster'].map(lambda x: cluster_summaries[x]['title'])
-            df_clean['cluster_explanation'] = df_clean['cluster'].map(lambda x: cluster_summaries[x]['explanation'])
-            df_clean['detailed_analysis'] = df_clean['cluster'].map(lambda x: cluster_summaries[x]['detailed_analysis'])
-            df_clean['Five_Top_Issues'] = df_clean['cluster'].map(lambda x: cluster_summaries[x]['Five_Top_Issues'])
-            
-            # Step 6: Prepare final dataset by removing embeddings column for CSV export
-            await self.update_task_status(task_id, "processing", 95, "Preparing final results...")
-            
-            # Remove embedding column for final CSV (keep all other cluster data)
-            df_final = df_clean.drop(columns=['embedding'])
-            
-            # Generate filename
-            #original_filename = await self.storage.get_dataset_filename(dataset_id)
-            result_filename = f"clustered_{original_filename}"
-            result_dataset_id = await self.storage.save_dataset(
-                df_clean, 
-                result_filename,
-                f"Clustered analysis of {original_filename} with {n_clusters} clusters"
-            )
-            
-            # Complete
-            await self.update_task_status(
-                task_id, "completed", 100,
-                f"Clustering completed! Found {n_clusters} clusters.",
-                result_dataset_id
-            )
-            
-            logger.info(f"Task {task_id}: Clustering completed successfully")
-            
-        except Exception as e:
-            logger.error(f"Task {task_id}: Clustering failed - {str(e)}")
-            await self.update_task_status(
-                task_id, "failed", 0,
-                f"Clustering failed: {str(e)}"
-            )
-
+import pandas as pd
+import numpy as np
+import re
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime
+from pathlib import Path
+from openai import AsyncOpenAI, RateLimitError, APIConnectionError, InternalServerError
+from collections import Counter
+from sklearn.preprocessing import normalize
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from tqdm import tqdm
+
+from app.config import settings
+from app.services.storage import StorageService
+from app.services.embedding_cache import EmbeddingCache
+from app.services.summary_cache import SummaryCache
+from app.services.embedding_providers import EmbeddingProvider, OpenAIEmbeddingProvider, get_embedding_provider
+from app.services.compute_pool import compute_pool
+from app.services.jobs import job_queue, JobCancelled
+from app.services.checkpoints import CheckpointStore
+from app.services.similarity import similarity_service
+from app.services.clustering_compute import (
+    reduce_matrix, find_optimal_k, fit_kmeans, fit_candidate, elbow_k, assign_to_centroids,
+    cluster_geometry, assign_nearest
+)
+from app.utils.text_cleaning import clean_description, clean_descriptions
+from app.utils.metrics import begin_stage, end_stage, record, track_stage
+
+logger = logging.getLogger(__name__)
+
+class ClusteringService:
+    # Bump when the summary prompt changes so cached summaries aren't reused
+    SUMMARY_PROMPT_VERSION = 1
+    
+    def __init__(self):
+        self.storage = StorageService()
+        self.embedding_cache = EmbeddingCache() if settings.embedding_cache_enabled else None
+        self.summary_cache = SummaryCache() if settings.summary_cache_enabled else None
+        # Initialize AsyncOpenAI client with new interface; retries are done (and counted) here
+        self.client = AsyncOpenAI(api_key=settings.openai_api_key).with_options(max_retries=0)
+        self.checkpoints = CheckpointStore()
+        
+    async def close(self):
+        """Release the embedding cache's database connection"""
+        if self.embedding_cache is not None:
+            await self.embedding_cache.close()
+    
+    async def create_task(self, task_id: str, dataset_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Create and queue a new clustering task"""
+        return await job_queue.enqueue(task_id, "clustering", dataset_id, params)
+    
+    async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get status of a clustering task"""
+        task = await job_queue.get(task_id)
+        if task:
+            logger.debug(f"Task {task_id} found - status: {task['status']}")
+        else:
+            logger.warning(f"Task {task_id} NOT FOUND")
+        return task
+    
+    async def update_task_status(self, task_id: str, status: str, progress: int, 
+                                message: str, result: Optional[str] = None,
+                                details: Optional[Dict[str, Any]] = None):
+        """Update task status (raises JobCancelled if the task was cancelled)"""
+        await job_queue.update(task_id, status, progress, message, result, details)
+    
+    async def run_job(self, task_id: str, dataset_id: str, params: Dict[str, Any]):
+        """Job queue handler: load the dataset and run the clustering pipeline"""
+        begin_stage("loading")
+        df = await self.storage.load_dataset(dataset_id)
+        if df is None:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        await self.process_clustering(task_id=task_id, dataset_id=dataset_id, df=df, **params)
+    
+    async def run_assignment_job(self, task_id: str, dataset_id: str, params: Dict[str, Any]):
+        """Job queue handler: load the dataset and assign it to an existing cluster model"""
+        begin_stage("loading")
+        df = await self.storage.load_dataset(dataset_id)
+        if df is None:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        await self.process_assignment(task_id=task_id, dataset_id=dataset_id, df=df, **params)
+    
+    def clean_description(self, text: str) -> str:
+        """Clean text description"""
+        return clean_description(text)
+    
+    def clean_descriptions(self, series: pd.Series, mode: Optional[str] = None) -> pd.Series:
+        """Clean a column of descriptions (vectorized unless configured otherwise)"""
+        return clean_descriptions(series, mode or settings.text_cleaning_mode)
+    
+    async def embed_query(self, text: str, dimensions: Optional[int] = None,
+                          provider: Optional[EmbeddingProvider] = None) -> np.ndarray:
+        """Embed a single cleaned text (e.g. a search query), consulting the cache first"""
+        return (await self.embed_texts(None, [text], dimensions, provider))[0]
+    
+    async def embed_texts(self, task_id: Optional[str], texts, dimensions: Optional[int] = None,
+                          provider: Optional[EmbeddingProvider] = None) -> np.ndarray:
+        """Embed unique texts, consulting the cache first. Returns a float32 matrix aligned with texts.
+        
+        Progress is reported on task_id when given.
+        """
+        provider = provider or get_embedding_provider()
+        cache = self.embedding_cache if provider.cacheable else None
+        cache_model = provider.namespace(dimensions)
+        vectors = [None] * len(texts)
+        
+        # Only texts missing from the embedding cache are sent to the provider
+        if cache:
+            cached = await cache.get_many(cache_model, texts)
+            for i, text in enumerate(texts):
+                vectors[i] = cached.get(text)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if cache:
+            record(cache_hits=len(texts) - len(missing))
+        missing_texts = [texts[i] for i in missing]
+        embedded = 0
+        
+        async def on_batch(positions, embeddings):
+            nonlocal embedded
+            if cache:
+                # Cache under the original text, even if the request carried a truncated one
+                await cache.put_many(cache_model, [missing_texts[p] for p in positions], embeddings)
+            
+            embedded += len(positions)
+            logger.info(f"Embedded {embedded}/{len(missing)} texts with {provider.name}")
+            if task_id:
+                progress = 30 + int((embedded / len(missing)) * 40)
+                await self.update_task_status(
+                    task_id, "processing", progress,
+                    f"Generating embeddings... {embedded}/{len(missing)} texts"
+                )
+        
+        new_embeddings = await provider.embed(missing_texts, dimensions, on_batch) if missing else None
+        
+        if new_embeddings is not None:
+            dim = new_embeddings.shape[1]
+        else:
+            dim = next((len(v) for v in vectors if v is not None), dimensions or 1536)
+        matrix = np.zeros((len(texts), dim), dtype=np.float32)
+        for i, vector in enumerate(vectors):
+            if vector is not None:
+                matrix[i] = vector
+        if new_embeddings is not None:
+            matrix[missing] = new_embeddings
+        return matrix
+    
+    async def embed_unique_texts(self, task_id: str, texts: List[str], reduction: str,
+                                 reduced_dimensions: int, resuming: bool,
+                                 provider: EmbeddingProvider) -> np.ndarray:
+        """Embed the unique texts of a task, reusing its embeddings checkpoint.
+        
+        Rows that failed to embed are stored as zero vectors; on resume only those are requested again.
+        """
+        # The "api" reduction asks the model itself for shorter embeddings
+        dimensions = reduced_dimensions if reduction == "api" else None
+        embeddings = self.checkpoints.load_array(task_id, "embeddings") if resuming else None
+        
+        if embeddings is None or len(embeddings) != len(texts):
+            embeddings = await self.embed_texts(task_id, texts, dimensions, provider)
+        else:
+            failed = np.flatnonzero(~embeddings.any(axis=1))
+            logger.info(f"Task {task_id}: resuming with embeddings from checkpoint "
+                        f"({len(failed)} failed rows to retry)")
+            if len(failed):
+                embeddings[failed] = await self.embed_texts(task_id, [texts[i] for i in failed], dimensions, provider)
+        
+        await asyncio.to_thread(self.checkpoints.save_array, task_id, "embeddings", embeddings)
+        return embeddings
+    
+    async def cluster_embeddings(self, task_id: str, X: np.ndarray, n_clusters: int,
+                                 k_selection: Optional[str], k_criterion: Optional[str],
+                                 reduction: str, reduced_dimensions: int
+                                 ) -> Tuple[np.ndarray, int, Dict[str, Any], Dict[str, np.ndarray]]:
+        """Optionally reduce the embeddings, then pick k and fit clusters in the compute pool.
+        
+        Returns (labels, n_clusters, details, model) where details describes the run for the
+        task result and model holds the arrays needed to assign new rows to these clusters.
+        """
+        model = {}
+        details = {
+            "reduction": reduction,
+            "dimensions": int(X.shape[1]),
+            "explained_variance": None
+        }
+        X_norm = await asyncio.to_thread(normalize, X, norm='l2')
+        
+        # KMeans and silhouette search run in the compute pool; workers memory-map the matrix
+        matrix_path = await asyncio.to_thread(compute_pool.share_matrix, X_norm, f"{task_id}_embeddings")
+        try:
+            if reduction in ("pca", "svd"):
+                await self.update_task_status(task_id, "processing", 67, "Reducing embedding dimensions...")
+                reduced_path = compute_pool.shared_path(f"{task_id}_reduced")
+                with track_stage("reduction"):
+                    explained, model["components"], model["mean"] = await compute_pool.run(
+                        reduce_matrix, str(matrix_path), str(reduced_path), reduction, reduced_dimensions
+                    )
+                compute_pool.release_matrix(matrix_path)
+                matrix_path = reduced_path
+                X_norm = np.load(matrix_path, mmap_mode='r')
+                details["dimensions"] = int(X_norm.shape[1])
+                details["explained_variance"] = explained
+                logger.info(f"Task {task_id}: reduced to {X_norm.shape[1]} dims with {reduction} "
+                            f"({explained:.1%} variance explained)")
+            
+            k_selection = k_selection or settings.k_selection_mode
+            if n_clusters == 0 and k_selection == "fast":
+                await self.update_task_status(task_id, "processing", 70, "Finding optimal clusters...")
+                with track_stage("k_selection"):
+                    n_clusters, centroids = await self.select_k_fast(X_norm, k_criterion or settings.k_selection_criterion)
+                # Reuse the winning model: label every row with its nearest centroid instead of refitting
+                labels = await compute_pool.run(assign_to_centroids, str(matrix_path), centroids)
+            else:
+                # Find optimal clusters using silhouette score
+                if n_clusters == 0:  # Auto-detect
+                    await self.update_task_status(task_id, "processing", 70, "Finding optimal clusters...")
+                    with track_stage("k_selection"):
+                        n_clusters, sil_scores = await compute_pool.run(find_optimal_k, str(matrix_path))
+                    logger.info(f"Auto-detected optimal clusters: {n_clusters} (scores: {sil_scores})")
+                
+                # Perform final clustering
+                labels = await compute_pool.run(fit_kmeans, str(matrix_path), n_clusters)
+            
+            # Centroids and outlier radii of the final clusters, for assigning future rows
+            model.update(await compute_pool.run(
+                cluster_geometry, str(matrix_path), labels, n_clusters, settings.outlier_quantile
+            ))
+        finally:
+            compute_pool.release_matrix(matrix_path)
+        
+        details["n_clusters"] = int(n_clusters)
+        return labels, n_clusters, details, model
+    
+    async def select_k_fast(self, X_norm: np.ndarray, criterion: str) -> Tuple[int, np.ndarray]:
+        """Pick k by fitting MiniBatchKMeans candidates on a shared subsample in parallel.
+        
+        Returns the chosen k and the centroids of its fitted model.
+        """
+        rng = np.random.default_rng(42)
+        sample_size = min(settings.k_selection_sample_size, len(X_norm))
+        sample_idx = np.sort(rng.choice(len(X_norm), size=sample_size, replace=False))
+        sample_path = await asyncio.to_thread(compute_pool.share_matrix, X_norm[sample_idx], "k_selection_sample")
+        
+        try:
+            candidates = await asyncio.gather(*(
+                compute_pool.run(fit_candidate, str(sample_path), k, criterion)
+                for k in range(2, min(11, sample_size))
+            ))
+        finally:
+            compute_pool.release_matrix(sample_path)
+        
+        if criterion == "elbow":
+            best_k = elbow_k([c["k"] for c in candidates], [c["inertia"] for c in candidates])
+            best = next(c for c in candidates if c["k"] == best_k)
+        else:
+            best = max(candidates, key=lambda c: c["score"])
+        
+        logger.info(f"Auto-detected optimal clusters: {best['k']} by {criterion} "
+                    f"(scores: {[(c['k'], c['score'], c['inertia']) for c in candidates]})")
+        return best["k"], best["centroids"]
+    
+    def keyword_summary(self, records, total_records: Optional[int] = None) -> str:
+        """Summarize a cluster from its most common words, in the LLM's output format (no network needed)"""
+        # dict.fromkeys dedupes words per record in a stable order, so ties break the same way every run
+        counts = Counter(
+            word for r in records for word in dict.fromkeys(str(r['clean_desc']).split())
+            if len(word) > 2 and word not in ENGLISH_STOP_WORDS
+        )
+        top_words = [word for word, _ in counts.most_common(5)]
+        return (
+            f"Title: {' '.join(top_words[:3]).title() or 'Unlabeled'}\n"
+            f"Explanation: Most common terms across {total_records or len(records)} records: {', '.join(top_words) or 'N/A'}\n"
+            "Detailed Analysis: Keyword summary (no LLM configured)\n"
+            f"Five Top Issues: {', '.join(top_words) or 'N/A'}"
+        )
+    
+    @property
+    def summary_model(self) -> str:
+        """Model that writes cluster summaries ("keywords" when no LLM is configured)"""
+        return settings.summary_model if settings.openai_api_key else "keywords"
+    
+    def representative_records(self, df_clean: pd.DataFrame, X: np.ndarray,
+                               id_column: str) -> Dict[Any, List[Dict[str, Any]]]:
+        """Pick each cluster's summary sample: the distinct descriptions nearest its centroid.
+        
+        The choice is deterministic, so an unchanged cluster yields the same sample
+        (and summary cache key) on every run.
+        """
+        codes = pd.factorize(df_clean['clean_desc'])[0]
+        ids = df_clean[id_column].to_numpy()
+        descriptions = df_clean['clean_desc'].to_numpy()
+        
+        records_by_cluster = {}
+        for label, rows in df_clean.groupby('cluster', sort=True).indices.items():
+            # One row per distinct description, so duplicates don't crowd out the sample
+            _, first = np.unique(codes[rows], return_index=True)
+            rows = rows[np.sort(first)]
+            vectors = normalize(X[rows], norm='l2')
+            similarity = vectors @ vectors.mean(axis=0)
+            nearest = rows[np.argsort(-similarity, kind='stable')[:settings.summary_sample_size]]
+            records_by_cluster[label] = [
+                {'number': number, 'clean_desc': description}
+                for number, description in zip(ids[nearest].tolist(), descriptions[nearest].tolist())
+            ]
+        return records_by_cluster
+    
+    async def categorize_and_explain_cluster(self, records, total_records: Optional[int] = None):
+        """Generate cluster title and explanation using LLM from a cluster's sample records"""
+        if not settings.openai_api_key:
+            return self.keyword_summary(records, total_records)
+        text_sample = "\n".join(f"ID {r['number']}: {r['clean_desc']}" for r in records)
+        total_records = total_records or len(records)
+        
+        system_prompt = (
+            "You are **ClusterNameBot**, an Business Consulting Assistant for ServiceNow.\n\n"  
+            "Your job is to look at a batch of ticket descriptions all belonging to the same cluster and give that cluster.\n\n"
+            "Please do the following:\n"
+            "1. Assign a **short, descriptive title** for this cluster (2-5 words max).\n"
+            "2. Do not use markdown just simple text.\n"
+            "3. Give a brief explanation of **why** you chose this title, highlighting any recurring themes, language or keywords.\n\n"
+            "Avoid generic names like 'Cluster 1' or 'Miscellaneous'. Make the title informative.\n\n"
+            "Avoid duplicates titles names. Make the title informative.\n\n"
+            "Format your output as:\n"
+            "Title: <your title>\n"
+            "Explanation: <your reasoning>\n"
+            "Detailed Analysis: <common pain points and relationships>\n"
+            "Five Top Issues: <reason with context given by the examples>"
+        )
+
+        user_prompt = (
+            f"Total records received: {total_records}.\n\n"
+            "Here are sample Records (Incident ID and description) from a single cluster:\n\n"
+            f"{text_sample}\n\n"
+            "Where possible, include in your explanation references to the incident IDs to indicate the source of your insights."
+        )
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        
+        # Use new OpenAI 1.0+ interface
+        for attempt in range(settings.summary_max_retries + 1):
+            if attempt:
+                record(retries=1)
+            record(api_calls=1)
+            try:
+                response = await self.client.chat.completions.create(
+                    model=settings.summary_model,
+                    messages=messages,
+                    temperature=0.3
+                )
+                break
+            except (RateLimitError, APIConnectionError, InternalServerError) as e:
+                if attempt == settings.summary_max_retries:
+                    raise
+                if isinstance(e, RateLimitError):
+                    delay = OpenAIEmbeddingProvider._retry_after(e)
+                else:
+                    delay = min(2 ** attempt, 8)
+                logger.warning(f"[Attempt {attempt+1}] Summary request failed: {e}. Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+        
+        if response.usage:
+            record(tokens=response.usage.total_tokens)
+        return response.choices[0].message.content
+    
+    def parse_cluster_summary(self, cluster_label, summary_text: str) -> Dict[str, str]:
+        """Parse the LLM response into summary fields"""
+        title_match = re.search(r'Title:\s*(.*?)\n', summary_text)
+        explanation_match = re.search(r'Explanation:\s*(.*?)(?=\n(?:Detailed Analysis:|Five Top Issues:|$))', 
+                                    summary_text, re.DOTALL)
+        detailed_match = re.search(r'Detailed Analysis:\s*(.*?)(?=\n(?:Five Top Issues:|$))', 
+                                 summary_text, re.DOTALL)
+        issues_match = re.search(r'Five Top Issues:\s*(.*)', summary_text, re.DOTALL)
+        
+        return {
+            'title': title_match.group(1).strip() if title_match else f'Cluster {cluster_label}',
+            'explanation': explanation_match.group(1).strip() if explanation_match else 'N/A',
+            'detailed_analysis': detailed_match.group(1).strip() if detailed_match else 'N/A',
+            'Five_Top_Issues': issues_match.group(1).strip() if issues_match else 'N/A'
+        }
+    
+    async def summarize_clusters(self, task_id: str, df_clean: pd.DataFrame, X: np.ndarray, id_column: str,
+                                 completed: Optional[Dict[Any, Dict[str, str]]] = None) -> Dict[Any, Dict[str, str]]:
+        """Summarize all clusters concurrently (bounded), reporting progress as each one finishes.
+        
+        Clusters already in completed (from a checkpoint) are skipped; every new
+        summary is checkpointed as soon as it arrives. Summaries of samples seen
+        before come from the summary cache without calling the LLM.
+        """
+        cluster_summaries = dict(completed or {})
+        records_by_cluster = {
+            label: records
+            for label, records in (await asyncio.to_thread(self.representative_records, df_clean, X, id_column)).items()
+            if label not in cluster_summaries
+        }
+        cluster_sizes = df_clean['cluster'].value_counts()
+        total_clusters = len(records_by_cluster) + len(cluster_summaries)
+        semaphore = asyncio.Semaphore(settings.summary_concurrency)
+        model = self.summary_model
+        cache_hits = 0
+        
+        async def summarize(cluster_label, records):
+            nonlocal cache_hits
+            cache_key = SummaryCache.make_key(model, self.SUMMARY_PROMPT_VERSION, records)
+            summary_text = await self.summary_cache.get(cache_key) if self.summary_cache else None
+            if summary_text is not None:
+                cache_hits += 1
+                record(cache_hits=1)
+                return cluster_label, self.parse_cluster_summary(cluster_label, summary_text)
+            
+            async with semaphore:
+                try:
+                    summary_text = await asyncio.wait_for(
+                        self.categorize_and_explain_cluster(records, int(cluster_sizes[cluster_label])),
+                        timeout=settings.summary_timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"Summary for cluster {cluster_label} timed out after {settings.summary_timeout}s")
+            if self.summary_cache:
+                await self.summary_cache.put(cache_key, model, self.SUMMARY_PROMPT_VERSION, summary_text)
+            return cluster_label, self.parse_cluster_summary(cluster_label, summary_text)
+        
+        pending = [asyncio.create_task(summarize(label, records)) for label, records in records_by_cluster.items()]
+        try:
+            for finished in asyncio.as_completed(pending):
+                cluster_label, summary = await finished
+                cluster_summaries[cluster_label] = summary
+                await asyncio.to_thread(
+                    self.checkpoints.save_json, task_id, "summaries",
+                    [[int(label), summary] for label, summary in cluster_summaries.items()]
+                )
+                
+                progress = 80 + int((len(cluster_summaries) / total_clusters) * 15)
+                await self.update_task_status(
+                    task_id, "processing", progress,
+                    f"Analyzing clusters... {len(cluster_summaries)}/{total_clusters}"
+                )
+        finally:
+            # One failed summary fails the task; don't leave the others running
+            for task in pending:
+                task.cancel()
+        
+        logger.info(f"Task {task_id}: {cache_hits}/{len(records_by_cluster)} cluster summaries from cache")
+        return cluster_summaries
+    
+    async def process_clustering(self, task_id: str, dataset_id: str, df: pd.DataFrame,
+                               description_column: str, number_column: Optional[str],
+                               n_clusters: int = 5, k_selection: Optional[str] = None,
+                               k_criterion: Optional[str] = None, reduction: Optional[str] = None,
+                               reduced_dimensions: Optional[int] = None,
+                               embedding_provider: Optional[str] = None):
+        """Main clustering process.
+        
+        Each stage's output is checkpointed under the task id, so running the same
+        task again (see the resume endpoint) continues after the last finished stage.
+        """
+        try:
+            await self.update_task_status(task_id, "processing", 10, "Starting clustering analysis......")
+            logger.info(f"Task {task_id}: Starting clustering for dataset {dataset_id}")
+            
+            reduction = reduction or settings.reduction_method
+            reduced_dimensions = reduced_dimensions or settings.reduced_dimensions
+            k_selection = k_selection or settings.k_selection_mode
+            k_criterion = k_criterion or settings.k_selection_criterion
+            provider = get_embedding_provider(embedding_provider)
+            resuming = await asyncio.to_thread(self.checkpoints.begin, task_id, {
+                "dataset_id": dataset_id,
+                "description_column": description_column,
+                "number_column": number_column,
+                "n_clusters": n_clusters,
+                "k_selection": k_selection,
+                "k_criterion": k_criterion,
+                "reduction": reduction,
+                "reduced_dimensions": reduced_dimensions,
+                "embedding_provider": provider.name,
+                "embedding_model": provider.model
+            })
+            
+            # Step 1: Clean descriptions
+            begin_stage("cleaning")
+            df_clean = await asyncio.to_thread(self.checkpoints.load_frame, task_id, "cleaned") if resuming else None
+            if df_clean is None:
+                df['clean_desc'] = await asyncio.to_thread(self.clean_descriptions, df[description_column])
+                df_clean = df.drop(columns=[description_column])
+                
+                # Drop empty descriptions
+                mask = df_clean['clean_desc'].astype(str).str.strip() != ""
+                df_clean = df_clean.loc[mask].reset_index(drop=True)
+                await asyncio.to_thread(self.checkpoints.save_frame, task_id, "cleaned", df_clean)
+            else:
+                logger.info(f"Task {task_id}: resuming with {len(df_clean)} cleaned rows from checkpoint")
+            
+            # Step 2: Generate embeddings
+            begin_stage("embedding")
+            await self.update_task_status(task_id, "processing", 10, "Generating embeddings...")
+            # Identical cleaned descriptions are embedded once and fanned back out to rows
+            codes, unique_texts = pd.factorize(df_clean['clean_desc'])
+            logger.info(f"Task {task_id}: {len(unique_texts)} unique descriptions out of {len(codes)} rows")
+            unique_embeddings = await self.embed_unique_texts(task_id, unique_texts.tolist(), reduction,
+                                                              reduced_dimensions, resuming, provider)
+            X = unique_embeddings[codes]
+            
+            # Step 3: Clustering
+            begin_stage("clustering")
+            await self.update_task_status(task_id, "processing", 65, "Performing clustering...")
+            labels = self.checkpoints.load_array(task_id, "labels") if resuming else None
+            model = self.checkpoints.load_arrays(task_id, "model") if resuming else None
+            clusters = self.checkpoints.load_json(task_id, "clusters") if resuming else None
+            if labels is None or model is None or clusters is None:
+                labels, n_clusters, details, model = await self.cluster_embeddings(
+                    task_id, X, n_clusters, k_selection, k_criterion, reduction, reduced_dimensions
+                )
+                await asyncio.to_thread(self.checkpoints.save_array, task_id, "labels", labels)
+                await asyncio.to_thread(self.checkpoints.save_arrays, task_id, "model", model)
+                self.checkpoints.save_json(task_id, "clusters", {"n_clusters": int(n_clusters), "details": details})
+            else:
+                n_clusters, details = clusters["n_clusters"], clusters["details"]
+                logger.info(f"Task {task_id}: resuming with {n_clusters} clusters from checkpoint")
+            df_clean['cluster'] = labels
+            
+            ## Step 4: Save intermediate clustering data as parquet to preserve data types
+            begin_stage("saving")
+            await self.update_task_status(task_id, "processing", 75, "Saving intermediate clustering data...")
+            
+            # Generate intermediate parquet filename
+            original_filename = await self.storage.get_dataset_filename(dataset_id)
+            intermediate_name = f"clustering_intermediate_{Path(original_filename).stem}"
+            
+            # Cluster data goes to parquet; embeddings to a float32 .npy sidecar that can be memory-mapped
+            parquet_path = settings.data_dir / f"{intermediate_name}.parquet"
+            await asyncio.to_thread(df_clean.to_parquet, parquet_path, index=False)
+            await asyncio.to_thread(np.save, settings.data_dir / f"{intermediate_name}.embeddings.npy", X)
+            logger.info(f"Saved intermediate clustering data to {parquet_path}")
+            
+            # Step 5: Generate cluster explanations
+            begin_stage("summaries")
+            await self.update_task_status(task_id, "processing", 80, "Generating cluster insights...")
+            
+            # Use number_column if provided, otherwise use index
+            if number_column and number_column in df_clean.columns:
+                id_column = number_column
+            else:
+                df_clean['number'] = df_clean.index
+                id_column = 'number'
+            
+            completed = self.checkpoints.load_json(task_id, "summaries") if resuming else None
+            cluster_summaries = await self.summarize_clusters(
+                task_id, df_clean, X, id_column, {label: summary for label, summary in completed or []}
+            )
+            
+            # Map summaries back to dataframe
+            def summary_field(field):
+                return {label: summary[field] for label, summary in cluster_summaries.items()}
+            
+            df_clean['cluster_title'] = df_clean['cluster'].map(summary_field('title'))
+            df_clean['cluster_explanation'] = df_clean['cluster'].map(summary_field('explanation'))
+            df_clean['detailed_analysis'] = df_clean['cluster'].map(summary_field('detailed_analysis'))
+            df_clean['Five_Top_Issues'] = df_clean['cluster'].map(summary_field('Five_Top_Issues'))
+            
+            # Step 6: Save final dataset
+            begin_stage("results")
+            await self.update_task_status(task_id, "processing", 95, "Preparing final results...")
+            
+            # Generate filename
+            result_filename = f"clustered_{original_filename}"
+            result_dataset_id = await self.storage.save_dataset(
+                df_clean, 
+                result_filename,
+                f"Clustered analysis of {original_filename} with {n_clusters} clusters"
+            )
+            # Embeddings are kept next to the result for re-clustering and similarity features
+            await self.storage.save_embeddings(result_dataset_id, X)
+            # The fitted model lets later exports be assigned to these same clusters
+            await self.storage.save_cluster_model(result_dataset_id, model, {
+                "source_dataset_id": dataset_id,
+                "task_id": task_id,
+                "created_at": datetime.now().isoformat(),
+                "embedding_provider": provider.name,
+                "embedding_model": provider.model,
+                "embedding_dimensions": reduced_dimensions if reduction == "api" else None,
+                "reduction": reduction,
+                "n_clusters": int(n_clusters),
+                "outlier_quantile": settings.outlier_quantile,
+                "clusters": {str(label): summary for label, summary in cluster_summaries.items()}
+            })
+            # Build the similar-ticket index now so the first search doesn't pay for it
+            with track_stage("similarity_index"):
+                await similarity_service.build_index(result_dataset_id)
+            end_stage()
+            
+            # Complete
+            await self.update_task_status(
+                task_id, "completed", 100,
+                f"Clustering completed! Found {n_clusters} clusters.",
+                result_dataset_id,
+                details
+            )
+            
+            logger.info(f"Task {task_id}: Clustering completed successfully")
+            await asyncio.to_thread(self.checkpoints.clear, task_id)
+            
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Task {task_id}: Clustering failed - {str(e)}")
+            await self.update_task_status(
+                task_id, "failed", 0,
+                f"Clustering failed: {str(e)}"
+            )
+    
+    async def process_assignment(self, task_id: str, dataset_id: str, df: pd.DataFrame, model_id: str,
+                                 description_column: str, number_column: Optional[str] = None,
+                                 max_distance: Optional[float] = None):
+        """Assign the rows of a new dataset to the clusters of an earlier run.
+        
+        Only the new rows are embedded (and only texts missing from the embedding
+        cache reach the API); clusters keep their labels and titles. Rows farther
+        from their centroid than the cluster's outlier radius, or than max_distance
+        if given, are flagged in the is_outlier column.
+        """
+        try:
+            await self.update_task_status(task_id, "processing", 10, "Loading cluster model...")
+            cluster_model = await self.storage.load_cluster_model(model_id)
+            if cluster_model is None:
+                raise ValueError(f"Dataset {model_id} has no cluster model")
+            model, metadata = cluster_model
+            # New rows must land in the model's vector space
+            provider = get_embedding_provider(metadata.get("embedding_provider", "openai"))
+            if metadata["embedding_model"] != provider.model:
+                raise ValueError(f"Cluster model was built with {metadata['embedding_model']}, "
+                                 f"but the configured embedding model is {provider.model}")
+            
+            # Step 1: Clean descriptions
+            begin_stage("cleaning")
+            df['clean_desc'] = await asyncio.to_thread(self.clean_descriptions, df[description_column])
+            df_clean = df.drop(columns=[description_column])
+            mask = df_clean['clean_desc'].astype(str).str.strip() != ""
+            df_clean = df_clean.loc[mask].reset_index(drop=True)
+            
+            # Step 2: Embed the new rows
+            begin_stage("embedding")
+            await self.update_task_status(task_id, "processing", 20, "Generating embeddings...")
+            codes, unique_texts = pd.factorize(df_clean['clean_desc'])
+            unique_embeddings = await self.embed_texts(
+                task_id, unique_texts.tolist(), metadata["embedding_dimensions"], provider
+            )
+            X = unique_embeddings[codes]
+            
+            # Step 3: Nearest-centroid assignment in one vectorized pass
+            begin_stage("assignment")
+            await self.update_task_status(task_id, "processing", 75, "Assigning rows to clusters...")
+            X_norm = await asyncio.to_thread(normalize, X, norm='l2')
+            matrix_path = await asyncio.to_thread(compute_pool.share_matrix, X_norm, f"{task_id}_embeddings")
+            try:
+                labels, distances = await compute_pool.run(
+                    assign_nearest, str(matrix_path), model["centroids"], model.get("components"), model.get("mean")
+                )
+            finally:
+                compute_pool.release_matrix(matrix_path)
+            
+            radius = np.full(len(labels), max_distance, dtype=np.float32) if max_distance else model["radii"][labels]
+            df_clean['cluster'] = labels
+            df_clean['cluster_distance'] = distances
+            # The tolerance keeps float noise from flagging rows that sit on a zero-radius cluster
+            df_clean['is_outlier'] = distances > radius + 1e-5
+            
+            # Same columns as a clustering result, from the model's stored summaries
+            summary_columns = {
+                'cluster_title': 'title',
+                'cluster_explanation': 'explanation',
+                'detailed_analysis': 'detailed_analysis',
+                'Five_Top_Issues': 'Five_Top_Issues'
+            }
+            for column, field in summary_columns.items():
+                df_clean[column] = df_clean['cluster'].map(
+                    {int(label): summary[field] for label, summary in metadata["clusters"].items()}
+                )
+            
+            # Step 4: Save results
+            begin_stage("results")
+            await self.update_task_status(task_id, "processing", 95, "Preparing final results...")
+            original_filename = await self.storage.get_dataset_filename(dataset_id)
+            n_outliers = int(df_clean['is_outlier'].sum())
+            result_dataset_id = await self.storage.save_dataset(
+                df_clean,
+                f"assigned_{original_filename}",
+                f"{original_filename} assigned to the {metadata['n_clusters']} clusters of {model_id}"
+            )
+            await self.storage.save_embeddings(result_dataset_id, X)
+            with track_stage("similarity_index"):
+                await similarity_service.build_index(result_dataset_id)
+            end_stage()
+            
+            await self.update_task_status(
+                task_id, "completed", 100,
+                f"Assigned {len(df_clean)} rows to {metadata['n_clusters']} clusters ({n_outliers} outliers).",
+                result_dataset_id,
+                {"model_id": model_id, "n_clusters": metadata["n_clusters"],
+                 "rows": len(df_clean), "outliers": n_outliers}
+            )
+            logger.info(f"Task {task_id}: Assignment completed successfully")
+            
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Task {task_id}: Assignment failed - {str(e)}")
+            await self.update_task_status(
+                task_id, "failed", 0,
+                f"Assignment failed: {str(e)}"
+            )
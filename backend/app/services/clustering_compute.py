@@ -0,0 +1,222 @@
+"""CPU-bound clustering stages.
+
+These functions run inside the compute process pool, so they only depend on
+numpy/scikit-learn and take the embedding matrix as a path to a .npy file that
+is memory-mapped instead of pickled across processes.
+"""
+import numpy as np
+from typing import List, Tuple
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import (
+    silhouette_score, calinski_harabasz_score, pairwise_distances_argmin, pairwise_distances_argmin_min
+)
+from sklearn.decomposition import PCA, TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.utils import resample
+
+def load_matrix(matrix_path: str) -> np.ndarray:
+    """Memory-map a matrix written by ComputePool.share_matrix"""
+    return np.load(matrix_path, mmap_mode='r')
+
+def reduce_matrix(matrix_path: str, output_path: str, method: str, n_components: int,
+                  random_state: int = 42) -> Tuple[float, np.ndarray, np.ndarray]:
+    """Project the matrix to n_components dimensions and write it (L2-normalized) to output_path.
+
+    Returns the fraction of variance explained by the kept components, plus the
+    projection (components, mean) so new rows can be mapped with project_rows.
+    """
+    X = load_matrix(matrix_path)
+    n_components = min(n_components, X.shape[1], len(X))
+    if method == "pca":
+        reducer = PCA(n_components=n_components, svd_solver="randomized", random_state=random_state)
+    elif method == "svd":
+        reducer = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=random_state)
+    else:
+        raise ValueError(f"Unknown reduction method: {method}")
+
+    # fit + transform rather than fit_transform: the randomized solver's U*S only
+    # approximates X @ components.T, and new rows are mapped with the latter
+    reduced = reducer.fit(X).transform(X).astype(np.float32)
+    np.save(output_path, normalize(reduced, norm='l2'))
+    # TruncatedSVD doesn't center, so its projection has a zero mean
+    mean = getattr(reducer, "mean_", np.zeros(X.shape[1]))
+    return (float(reducer.explained_variance_ratio_.sum()),
+            reducer.components_.astype(np.float32), np.asarray(mean, dtype=np.float32))
+
+def project_rows(X: np.ndarray, components: np.ndarray, mean: np.ndarray) -> np.ndarray:
+    """Map L2-normalized embeddings into the reduced space written by reduce_matrix"""
+    return normalize((X - mean) @ components.T, norm='l2')
+
+def find_optimal_k(matrix_path: str, k_min: int = 2, k_max: int = 10,
+                   sample_size: int = 5000, random_state: int = 42) -> Tuple[int, List[Tuple[int, float]]]:
+    """Pick the number of clusters with the highest silhouette score"""
+    X = load_matrix(matrix_path)
+    sil_scores = []
+    sample_size = min(sample_size, len(X))
+
+    for k in range(k_min, min(k_max + 1, len(X))):
+        km = KMeans(n_clusters=k, random_state=random_state, n_init=10)
+        labels = km.fit_predict(X)
+
+        X_sample, labels_sample = resample(X, labels, n_samples=sample_size, random_state=random_state)
+        score = silhouette_score(X_sample, labels_sample)
+        sil_scores.append((k, float(score)))
+
+    # Choose k with highest silhouette score
+    best_k = max(sil_scores, key=lambda x: x[1])[0]
+    return best_k, sil_scores
+
+def fit_kmeans(matrix_path: str, n_clusters: int, random_state: int = 42) -> np.ndarray:
+    """Fit KMeans on the full matrix and return the cluster labels"""
+    X = load_matrix(matrix_path)
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10)
+    return kmeans.fit_predict(X)
+
+def fit_candidate(matrix_path: str, k: int, criterion: str = "silhouette",
+                  score_sample_size: int = 5000, random_state: int = 42) -> dict:
+    """Fit MiniBatchKMeans for one candidate k on the shared subsample and score it"""
+    X = load_matrix(matrix_path)
+    km = MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3, batch_size=2048)
+    labels = km.fit_predict(X)
+
+    if criterion == "silhouette":
+        X_score, labels_score = X, labels
+        if len(X) > score_sample_size:
+            X_score, labels_score = resample(X, labels, n_samples=score_sample_size,
+                                             replace=False, random_state=random_state)
+        score = silhouette_score(X_score, labels_score)
+    elif criterion == "calinski_harabasz":
+        score = calinski_harabasz_score(X, labels)
+    elif criterion == "elbow":
+        # Scored across all candidates by elbow_k
+        score = None
+    else:
+        raise ValueError(f"Unknown k selection criterion: {criterion}")
+
+    return {
+        "k": k,
+        "score": None if score is None else float(score),
+        "inertia": float(km.inertia_),
+        "centroids": km.cluster_centers_.astype(np.float32)
+    }
+
+def elbow_k(ks: List[int], inertias: List[float]) -> int:
+    """Pick the k whose inertia lies farthest below the line joining the first and last candidates"""
+    if len(ks) < 3:
+        return ks[int(np.argmin(inertias))]
+    x = np.asarray(ks, dtype=float)
+    y = np.asarray(inertias, dtype=float)
+    x = (x - x[0]) / (x[-1] - x[0])
+    y = (y - y[-1]) / ((y[0] - y[-1]) or 1.0)
+    # Normalized curve falls from (0, 1) to (1, 0); the elbow is farthest from the chord x + y = 1
+    return ks[int(np.argmax(1 - x - y))]
+
+def assign_to_centroids(matrix_path: str, centroids: np.ndarray) -> np.ndarray:
+    """Label every row with its nearest centroid (chunked, so memory stays bounded)"""
+    X = load_matrix(matrix_path)
+    return pairwise_distances_argmin(X, centroids)
+
+def cluster_geometry(matrix_path: str, labels: np.ndarray, n_clusters: int,
+                     quantile: float = 0.99, chunk_size: int = 65536) -> dict:
+    """Compute each cluster's centroid and outlier radius from the final labels.
+
+    The radius is the given quantile of member distances to the centroid; rows
+    assigned later that land farther away are flagged as outliers.
+    """
+    X = load_matrix(matrix_path)
+    centroids = np.zeros((n_clusters, X.shape[1]), dtype=np.float64)
+    counts = np.bincount(labels, minlength=n_clusters)
+    for start in range(0, len(X), chunk_size):
+        chunk_labels = labels[start:start + chunk_size]
+        # One-hot product sums each cluster's rows in a single BLAS call
+        membership = np.zeros((len(chunk_labels), n_clusters), dtype=np.float32)
+        membership[np.arange(len(chunk_labels)), chunk_labels] = 1
+        centroids += membership.T @ X[start:start + chunk_size]
+    centroids /= np.maximum(counts, 1)[:, None]
+
+    distances = np.empty(len(X), dtype=np.float32)
+    for start in range(0, len(X), chunk_size):
+        chunk = X[start:start + chunk_size]
+        distances[start:start + len(chunk)] = np.linalg.norm(chunk - centroids[labels[start:start + len(chunk)]], axis=1)
+
+    radii = np.zeros(n_clusters, dtype=np.float32)
+    for k in np.flatnonzero(counts):
+        radii[k] = np.quantile(distances[labels == k], quantile)
+    return {"centroids": centroids.astype(np.float32), "radii": radii}
+
+def assign_nearest(matrix_path: str, centroids: np.ndarray, components: np.ndarray = None,
+                   mean: np.ndarray = None, chunk_size: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """Label L2-normalized rows with their nearest centroid, projecting them first if the model was reduced.
+
+    Returns (labels, distances to the assigned centroid).
+    """
+    X = load_matrix(matrix_path)
+    labels = np.empty(len(X), dtype=np.int64)
+    distances = np.empty(len(X), dtype=np.float32)
+    for start in range(0, len(X), chunk_size):
+        chunk = np.asarray(X[start:start + chunk_size])
+        if components is not None:
+            chunk = project_rows(chunk, components, mean)
+        end = start + len(chunk)
+        labels[start:end], distances[start:end] = pairwise_distances_argmin_min(chunk, centroids)
+    return labels, distances
+
+def build_ivf_index(embeddings_path: str, labels: np.ndarray, index_path: str, meta_path: str,
+                    list_size: int = 4096, fit_sample_size: int = 20000,
+                    chunk_size: int = 65536, random_state: int = 42) -> int:
+    """Build an inverted-file (IVF) vector index from a dataset's embeddings.
+
+    Each cluster is split into lists of roughly list_size rows with MiniBatchKMeans,
+    so the index is seeded by the clustering instead of starting from scratch. The
+    L2-normalized rows are written to index_path grouped by list, so probing a list
+    reads one contiguous block of the memory-mapped file. meta_path receives the
+    list centroids, list offsets and the dataset row of every index row.
+
+    Returns the number of lists.
+    """
+    X = load_matrix(embeddings_path)
+    rng = np.random.default_rng(random_state)
+    lists = np.empty(len(X), dtype=np.int64)
+    n_lists = 0
+
+    for label in np.unique(labels):
+        rows = np.flatnonzero(labels == label)
+        n_sublists = int(np.ceil(len(rows) / list_size))
+        if n_sublists <= 1:
+            lists[rows] = n_lists
+        else:
+            fit_rows = np.sort(rng.choice(rows, size=min(fit_sample_size, len(rows)), replace=False))
+            km = MiniBatchKMeans(n_clusters=n_sublists, random_state=random_state, n_init=1, batch_size=2048)
+            km.fit(normalize(X[fit_rows]))
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                lists[chunk] = n_lists + km.predict(normalize(X[chunk]))
+        n_lists += max(n_sublists, 1)
+
+    order = np.argsort(lists, kind="stable")
+    offsets = np.searchsorted(lists[order], np.arange(n_lists + 1))
+    centroids = np.zeros((n_lists, X.shape[1]), dtype=np.float32)
+
+    index = np.lib.format.open_memmap(index_path, mode="w+", dtype=np.float32, shape=X.shape)
+    for start in range(0, len(X), chunk_size):
+        chunk = normalize(X[order[start:start + chunk_size]]).astype(np.float32)
+        index[start:start + len(chunk)] = chunk
+        # Rows are sorted by list, so each list is a run of the chunk
+        chunk_lists = lists[order[start:start + len(chunk)]]
+        runs = np.flatnonzero(np.r_[True, chunk_lists[1:] != chunk_lists[:-1]])
+        centroids[chunk_lists[runs]] += np.add.reduceat(chunk, runs, axis=0)
+    index.flush()
+    del index
+
+    np.savez(meta_path, row_ids=order, offsets=offsets, centroids=normalize(centroids))
+    return n_lists
+
+def hashing_embeddings(texts: List[str], n_features: int) -> np.ndarray:
+    """Embed texts locally: hashed word unigrams and bigrams, sublinear counts, L2-normalized"""
+    vectorizer = HashingVectorizer(
+        n_features=n_features, ngram_range=(1, 2), alternate_sign=True, norm=None, dtype=np.float32
+    )
+    counts = vectorizer.transform(texts)
+    counts.data = np.sign(counts.data) * np.log1p(np.abs(counts.data))
+    return normalize(counts, norm='l2').toarray()
@@ -0,0 +1,67 @@
+import uuid
+import asyncio
+import logging
+import multiprocessing
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.config import settings
+from app.utils.metrics import record, timed_call
+
+logger = logging.getLogger(__name__)
+
+class ComputePool:
+    """Managed process pool for CPU-bound work that must not block the event loop"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or settings.clustering_workers
+        self.shared_dir = settings.data_dir / "temp"
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Start the worker processes on first use"""
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and SQLite threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Compute pool started with {self.max_workers} workers")
+        return self._executor
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run a picklable function in the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        # Worker CPU time and peak memory are charged to the calling task's current stage
+        result, cpu_seconds, peak_mb = await loop.run_in_executor(self.executor, timed_call, func, args)
+        record(pool_cpu_s=cpu_seconds)
+        if peak_mb is not None:
+            record(pool_peak_rss_mb=peak_mb)
+        return result
+
+    def shared_path(self, name: str = "matrix") -> Path:
+        """Reserve a unique .npy path for a matrix exchanged with the workers"""
+        return self.shared_dir / f"{name}_{uuid.uuid4().hex}.npy"
+
+    def share_matrix(self, matrix: np.ndarray, name: str = "matrix") -> Path:
+        """Write a matrix to a .npy file that workers memory-map instead of receiving a pickled copy"""
+        path = self.shared_path(name)
+        np.save(path, np.ascontiguousarray(matrix))
+        return path
+
+    @staticmethod
+    def release_matrix(path: Path):
+        """Remove a shared matrix file"""
+        Path(path).unlink(missing_ok=True)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Compute pool shut down")
+
+compute_pool = ComputePool()
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import aiosqlite
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class Database:
+    """Long-lived connections to the application's SQLite database.
+
+    A small pool of read-only connections serves queries concurrently while a
+    single writer connection, used under a lock, serializes writes. The
+    database runs in WAL mode, so readers never wait for the writer. Keeping
+    connections open (instead of one connection and thread per call) also
+    keeps sqlite3's per-connection cache of prepared statements warm.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, readers: Optional[int] = None):
+        self.db_path = db_path or settings.data_dir / "app.db"
+        self.n_readers = readers or settings.sqlite_readers
+        self.writer: Optional[aiosqlite.Connection] = None
+        self.readers: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.db_path, cached_statements=settings.sqlite_cached_statements)
+        await db.execute(f"PRAGMA busy_timeout = {settings.sqlite_busy_timeout_ms}")
+        # WAL makes NORMAL durable across application crashes; only an OS crash can lose the last commits
+        await db.execute("PRAGMA synchronous = NORMAL")
+        await db.execute(f"PRAGMA cache_size = -{settings.sqlite_cache_kb}")
+        await db.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            await db.execute("PRAGMA query_only = ON")
+        return db
+
+    async def open(self):
+        """Open the writer and reader connections (called from the app's lifespan)"""
+        async with self._open_lock:
+            if self.writer is not None:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            connections = [await self._connect(read_only=False)]
+            try:
+                # The journal mode is stored in the database file, so this also applies to other
+                # connections; its result row must be fetched, or the unfinished statement keeps a lock
+                await connections[0].execute_fetchall("PRAGMA journal_mode = WAL")
+                for _ in range(self.n_readers):
+                    connections.append(await self._connect(read_only=True))
+            except Exception:
+                # Open connections run a thread each, which would otherwise keep the process alive
+                for db in connections:
+                    await db.close()
+                raise
+            writer, self.readers = connections[0], connections[1:]
+            self._idle = asyncio.Queue()
+            for reader in self.readers:
+                self._idle.put_nowait(reader)
+            self.writer = writer
+            logger.info(f"Database opened: {self.db_path} (WAL, {self.n_readers} readers)")
+
+    async def close(self):
+        """Close all connections"""
+        async with self._write_lock:
+            for db in [*self.readers, self.writer]:
+                if db is not None:
+                    await db.close()
+            self.writer, self.readers, self._idle = None, [], None
+        # Fresh locks in case the database is reopened from another event loop
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool"""
+        if self.writer is None:
+            await self.open()
+        idle = self._idle
+        db = await idle.get()
+        try:
+            yield db
+        finally:
+            idle.put_nowait(db)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Use the writer connection; the transaction commits on exit and rolls back on error"""
+        if self.writer is None:
+            await self.open()
+        async with self._write_lock:
+            try:
+                yield self.writer
+                await self.writer.commit()
+            except BaseException:
+                await self.writer.rollback()
+                raise
+
+database = Database()
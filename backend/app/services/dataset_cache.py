@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import pandas as pd
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (dataset_id, parquet mtime in ns)
+CacheKey = Tuple[str, int]
+
+class DatasetCache:
+    """In-process LRU cache of decoded datasets, bounded by memory size.
+
+    Entries are keyed by dataset id plus the parquet file's mtime, so a
+    rewritten file is never served stale. Callers get the cached frame itself
+    and must treat it as read-only; StorageService.load_dataset copies it (in
+    a worker thread) for callers that modify their frame.
+    """
+
+    def __init__(self, max_size_mb: Optional[float] = None):
+        max_size_mb = settings.dataset_cache_max_mb if max_size_mb is None else max_size_mb
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.entries: "OrderedDict[CacheKey, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Loads in progress, so concurrent requests for a cold dataset decode it once
+        self._loading: Dict[CacheKey, asyncio.Task] = {}
+
+    async def get(self, key: CacheKey, load: Callable[[], Awaitable[pd.DataFrame]]) -> pd.DataFrame:
+        """Return the cached frame (shared, read-only), loading and caching it on a miss"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+        task = self._loading.get(key)
+        if task is None:
+            self.misses += 1
+            # The load runs as its own task, so a cancelled request doesn't fail the others waiting on it
+            task = asyncio.ensure_future(self._load(key, load))
+            self._loading[key] = task
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+    async def _load(self, key: CacheKey, load: Callable[[], Awaitable[pd.DataFrame]]) -> pd.DataFrame:
+        df = await load()
+        size = int(await asyncio.to_thread(lambda: df.memory_usage(deep=True).sum()))
+        self._put(key, df, size)
+        return df
+
+    def _put(self, key: CacheKey, df: pd.DataFrame, size: int):
+        """Store a frame, evicting least recently used entries to stay within the budget"""
+        # Older versions of the same dataset can't be requested anymore
+        self.invalidate(key[0])
+        if size > self.max_bytes:
+            logger.info(f"Dataset cache: {key[0]} ({size / (1024 * 1024):.1f} MB) exceeds the cache size, not cached")
+            return
+        while self.entries and self.size_bytes + size > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size_bytes -= evicted_size
+            self.evictions += 1
+        self.entries[key] = (df, size)
+        self.size_bytes += size
+
+    def invalidate(self, dataset_id: str):
+        """Drop every cached version of a dataset"""
+        for key in [key for key in self.entries if key[0] == dataset_id]:
+            self.size_bytes -= self.entries.pop(key)[1]
+
+    def clear(self):
+        """Drop all entries"""
+        self.entries.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Get cache size and hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "size_mb": self.size_bytes / (1024 * 1024),
+            "max_size_mb": self.max_bytes / (1024 * 1024),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+dataset_cache = DatasetCache()
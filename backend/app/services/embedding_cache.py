@@ -0,0 +1,182 @@
+import time
+import hashlib
+import asyncio
+import logging
+import aiosqlite
+import numpy as np
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Persistent, content-addressed embedding cache with LRU eviction.
+
+    Vectors are stored as float32 blobs keyed by a hash of (model, cleaned text),
+    so re-clustering the same export or an overlapping one only pays for new texts.
+    """
+
+    # SQLite caps the number of bound parameters per statement
+    QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, db_path: Optional[Path] = None, max_size_mb: Optional[float] = None):
+        self.db_path = db_path or settings.data_dir / "cache" / "embeddings.db"
+        max_size_mb = settings.embedding_cache_max_mb if max_size_mb is None else max_size_mb
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        # One connection for the life of the process, opened on first use
+        self._db: Optional[aiosqlite.Connection] = None
+        # Running size of the stored vectors, so puts don't scan the table to decide on eviction
+        self._total_bytes = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Build the content address for a text embedded with a given model"""
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    async def initialize(self):
+        """Open the cache database, creating it if needed, and read its current size"""
+        if self._db is not None:
+            return
+        async with self._lock:
+            if self._db is not None:
+                return
+
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            db = await aiosqlite.connect(self.db_path)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)"
+            )
+            await db.commit()
+            self._total_bytes = await self._stored_bytes(db)
+            self._db = db
+
+    async def close(self):
+        """Close the cache database connection"""
+        async with self._lock:
+            if self._db is not None:
+                await self._db.close()
+                self._db = None
+
+    @staticmethod
+    async def _stored_bytes(db: aiosqlite.Connection) -> int:
+        cursor = await db.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM embeddings")
+        return (await cursor.fetchone())[0]
+
+    async def get_many(self, model: str, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the given texts, keyed by text. Misses are omitted."""
+        await self.initialize()
+
+        key_to_text = {self.make_key(model, text): text for text in texts}
+        keys = list(key_to_text)
+        found: Dict[str, np.ndarray] = {}
+
+        async with self._lock:
+            db = self._db
+            for start in range(0, len(keys), self.QUERY_CHUNK_SIZE):
+                chunk = keys[start: start + self.QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = await db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk
+                )
+                hit_keys = []
+                async for key, blob in cursor:
+                    found[key_to_text[key]] = np.frombuffer(blob, dtype=np.float32)
+                    hit_keys.append(key)
+
+                if hit_keys:
+                    await db.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [time.time(), *hit_keys]
+                    )
+            await db.commit()
+
+        logger.info(f"Embedding cache: {len(found)} hits, {len(key_to_text) - len(found)} misses")
+        return found
+
+    async def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Store vectors for the given texts and evict least recently used entries if over budget"""
+        if not texts:
+            return
+        await self.initialize()
+
+        now = time.time()
+        rows = {}
+        for text, embedding in zip(texts, embeddings):
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+            key = self.make_key(model, text)
+            rows[key] = (key, model, len(blob) // 4, blob, len(blob), now)
+
+        async with self._lock:
+            db = self._db
+            # Keys already stored are replaced, so only the size difference counts
+            keys = list(rows)
+            for start in range(0, len(keys), self.QUERY_CHUNK_SIZE):
+                chunk = keys[start: start + self.QUERY_CHUNK_SIZE]
+                cursor = await db.execute(
+                    f"SELECT COALESCE(SUM(size_bytes), 0) FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                self._total_bytes -= (await cursor.fetchone())[0]
+            await db.executemany("""
+                INSERT OR REPLACE INTO embeddings (key, model, dim, vector, size_bytes, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows.values())
+            self._total_bytes += sum(row[4] for row in rows.values())
+            if self._total_bytes > self.max_bytes:
+                await self._evict(db)
+            await db.commit()
+
+    async def _evict(self, db: aiosqlite.Connection):
+        """Drop least recently used entries until the cache fits its size budget"""
+        # Other processes may have added or evicted entries since the size was last read
+        self._total_bytes = await self._stored_bytes(db)
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        # Evict down to 90% of the budget so we don't evict on every insert
+        to_free = self._total_bytes - int(self.max_bytes * 0.9)
+        freed = 0
+        evicted = []
+        cursor = await db.execute("SELECT key, size_bytes FROM embeddings ORDER BY last_access")
+        async for key, size_bytes in cursor:
+            evicted.append(key)
+            freed += size_bytes
+            if freed >= to_free:
+                break
+
+        for start in range(0, len(evicted), self.QUERY_CHUNK_SIZE):
+            chunk = evicted[start: start + self.QUERY_CHUNK_SIZE]
+            await db.execute(
+                f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+        self._total_bytes -= freed
+
+        logger.info(f"Embedding cache: evicted {len(evicted)} entries ({freed / (1024 * 1024):.1f} MB)")
+
+    async def stats(self) -> Dict[str, float]:
+        """Get cache size statistics"""
+        await self.initialize()
+        async with self._lock:
+            cursor = await self._db.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM embeddings")
+            entries, total_bytes = await cursor.fetchone()
+
+        return {
+            "entries": entries,
+            "size_mb": total_bytes / (1024 * 1024),
+            "max_size_mb": self.max_bytes / (1024 * 1024)
+        }
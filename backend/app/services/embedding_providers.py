@@ -0,0 +1,253 @@
+import time
+import asyncio
+import logging
+import numpy as np
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import tiktoken
+from openai import AsyncOpenAI, RateLimitError, BadRequestError, APIConnectionError, InternalServerError
+
+from app.config import settings
+from app.services.rate_limiter import RateLimiter
+from app.services.compute_pool import compute_pool
+from app.services.clustering_compute import hashing_embeddings
+from app.utils.metrics import record, track_stage
+
+logger = logging.getLogger(__name__)
+
+# Awaited after every finished batch with (positions in the input, embeddings)
+BatchCallback = Callable[[List[int], np.ndarray], Awaitable[None]]
+
+class EmbeddingProvider:
+    """Turns texts into embedding vectors.
+
+    Implementations return a float32 matrix aligned with the input texts, with
+    zero rows for texts that could not be embedded.
+    """
+    name = ""
+    # Whether vectors are worth keeping in the embedding cache
+    cacheable = True
+
+    @property
+    def model(self) -> str:
+        """Identifies the vector space; vectors from different models can't be compared"""
+        raise NotImplementedError
+
+    @classmethod
+    def native_dimensions(cls) -> Optional[int]:
+        """Size of full-length vectors (None if unknown)"""
+        return None
+
+    def namespace(self, dimensions: Optional[int] = None) -> str:
+        """Embedding cache namespace"""
+        # Shortened embeddings are different vectors, so they get their own cache namespace
+        return f"{self.model}@{dimensions}" if dimensions else self.model
+
+    async def embed(self, texts: List[str], dimensions: Optional[int] = None,
+                    on_batch: Optional[BatchCallback] = None) -> np.ndarray:
+        raise NotImplementedError
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API, with token-aware batching and shared rate limiting"""
+    name = "openai"
+    MAX_TOKENS = 8000  # per input text
+    MODEL_DIMENSIONS = {
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536,
+    }
+
+    def __init__(self):
+        if not settings.openai_api_key:
+            raise ValueError("OpenAI embeddings need an API key (set OPENAI_API_KEY, or use the 'hashing' embedding provider)")
+        self.embedding_model = settings.embedding_model
+        self.encoding = tiktoken.encoding_for_model(self.embedding_model)
+        # Embedding retries are paced by the shared limiter instead of the client's own backoff
+        self.client = AsyncOpenAI(api_key=settings.openai_api_key).with_options(max_retries=0)
+        self.rate_limiter = RateLimiter(settings.embedding_rpm, settings.embedding_tpm)
+
+    @property
+    def model(self) -> str:
+        return self.embedding_model
+
+    @classmethod
+    def native_dimensions(cls) -> Optional[int]:
+        return cls.MODEL_DIMENSIONS.get(settings.embedding_model)
+
+    def count_tokens(self, texts):
+        """Count tokens in texts"""
+        return sum(len(self.encoding.encode(t)) for t in texts)
+
+    def pack_batches(self, texts) -> List[Tuple[List[int], List[str], int]]:
+        """Tokenize all texts once and greedily pack them into request-sized batches.
+
+        Returns (positions, texts, token_count) per batch. Texts longer than
+        MAX_TOKENS are truncated so every input fits the model's context.
+        """
+        token_lists = self.encoding.encode_ordinary_batch(texts, num_threads=settings.tokenizer_threads)
+
+        batches = []
+        positions, batch_texts, batch_tokens = [], [], 0
+        for i, (text, tokens) in enumerate(zip(texts, token_lists)):
+            n_tokens = len(tokens)
+            if n_tokens > self.MAX_TOKENS:
+                logger.warning(f"Truncating text of {n_tokens} tokens to {self.MAX_TOKENS}")
+                text = self.encoding.decode(tokens[:self.MAX_TOKENS])
+                n_tokens = self.MAX_TOKENS
+
+            if positions and (batch_tokens + n_tokens > settings.embedding_batch_max_tokens
+                              or len(positions) >= settings.embedding_batch_max_items):
+                batches.append((positions, batch_texts, batch_tokens))
+                positions, batch_texts, batch_tokens = [], [], 0
+
+            positions.append(i)
+            batch_texts.append(text)
+            batch_tokens += n_tokens
+
+        if positions:
+            batches.append((positions, batch_texts, batch_tokens))
+
+        logger.info(f"Packed {len(texts)} texts into {len(batches)} batches")
+        return batches
+
+    async def embed_batch(self, texts, model=None, retries=None, n_tokens=None, dimensions=None):
+        """Embed a batch of texts (expected to be packed by pack_batches)"""
+        model = model or self.embedding_model
+        retries = settings.embedding_max_retries if retries is None else retries
+        # filter empty
+        texts = [t if t is not None else "" for t in texts]
+        if n_tokens is None:
+            n_tokens = self.count_tokens(texts)
+
+        # try embedding; pacing and 429 back-off go through the shared rate limiter
+        for attempt in range(retries + 1):
+            if attempt:
+                record(retries=1)
+            waited = time.perf_counter()
+            await self.rate_limiter.acquire(n_tokens)
+            record(api_calls=1, throttled_s=time.perf_counter() - waited)
+            try:
+                params = {"dimensions": dimensions} if dimensions else {}
+                response = await self.client.embeddings.create(
+                    model=model,
+                    input=texts,
+                    **params
+                )
+                record(tokens=response.usage.total_tokens if response.usage else n_tokens)
+                return [embedding.embedding for embedding in response.data]
+            except RateLimitError as e:
+                self.rate_limiter.pause(self._retry_after(e))
+                logger.warning(f"[Attempt {attempt+1}] Rate limited embedding {len(texts)} texts")
+            except BadRequestError as e:
+                # A single bad input should not fail its whole batch
+                if len(texts) == 1:
+                    raise
+                logger.warning(f"Bad request for batch of {len(texts)} texts, splitting: {e}")
+                mid = len(texts) // 2
+                emb1 = await self.embed_batch(texts[:mid], model, retries, dimensions=dimensions)
+                emb2 = await self.embed_batch(texts[mid:], model, retries, dimensions=dimensions)
+                return emb1 + emb2
+            except (APIConnectionError, InternalServerError) as e:
+                # Connection errors, timeouts and 5xx are transient; anything else (auth, not found...) is raised
+                if attempt == retries:
+                    raise
+                delay = min(2 ** attempt, 8)
+                logger.warning(f"[Attempt {attempt+1}] Embedding request failed: {e}. Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+        raise RuntimeError(f"Batch embedding failed for {len(texts)} texts after {retries + 1} attempts")
+
+    @staticmethod
+    def _retry_after(error: RateLimitError) -> float:
+        """Seconds to wait after a 429, from the response headers when available"""
+        headers = error.response.headers if error.response is not None else {}
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            pass
+        return 1.0
+
+    async def embed(self, texts: List[str], dimensions: Optional[int] = None,
+                    on_batch: Optional[BatchCallback] = None) -> np.ndarray:
+        """Embed texts with several request-sized batches in flight"""
+        vectors = [None] * len(texts)
+        # Tokenization runs in native threads, off the event loop
+        with track_stage("tokenization"):
+            batches = await asyncio.to_thread(self.pack_batches, texts) if texts else []
+        semaphore = asyncio.Semaphore(settings.embedding_concurrency)
+
+        async def run_batch(positions, batch, n_tokens):
+            async with semaphore:
+                try:
+                    embs = await self.embed_batch(batch, n_tokens=n_tokens, dimensions=dimensions)
+                except Exception as e:
+                    # Failed rows keep None and become zero vectors below
+                    logger.error(f"Batch embedding failed: {e}")
+                    return
+            for i, emb in zip(positions, embs):
+                vectors[i] = emb
+            if on_batch:
+                await on_batch(positions, np.asarray(embs, dtype=np.float32))
+
+        await asyncio.gather(*(run_batch(*batch) for batch in batches))
+
+        dim = next((len(v) for v in vectors if v is not None), dimensions or 1536)
+        matrix = np.zeros((len(texts), dim), dtype=np.float32)
+        for i, vector in enumerate(vectors):
+            if vector is not None:
+                matrix[i] = vector
+        return matrix
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Fully local embeddings from hashed word n-grams (no network, no fitted state).
+
+    Vectors depend only on the text, so datasets embedded at different times
+    stay comparable for assignment and similarity search.
+    """
+    name = "hashing"
+    cacheable = False  # recomputing is cheaper than a cache lookup
+    CHUNK_SIZE = 20000  # texts per compute pool call
+
+    @property
+    def model(self) -> str:
+        return "local-hashing-v1"
+
+    @classmethod
+    def native_dimensions(cls) -> Optional[int]:
+        return settings.local_embedding_dimensions
+
+    async def embed(self, texts: List[str], dimensions: Optional[int] = None,
+                    on_batch: Optional[BatchCallback] = None) -> np.ndarray:
+        """Hash texts in chunks in the compute pool"""
+        n_features = dimensions or settings.local_embedding_dimensions
+        chunks = [list(range(start, min(start + self.CHUNK_SIZE, len(texts))))
+                  for start in range(0, len(texts), self.CHUNK_SIZE)]
+        matrix = np.zeros((len(texts), n_features), dtype=np.float32)
+
+        async def run_chunk(positions):
+            embs = await compute_pool.run(hashing_embeddings, [texts[i] for i in positions], n_features)
+            matrix[positions[0]:positions[-1] + 1] = embs
+            if on_batch:
+                await on_batch(positions, embs)
+
+        await asyncio.gather(*(run_chunk(positions) for positions in chunks))
+        return matrix
+
+EMBEDDING_PROVIDERS = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+    HashingEmbeddingProvider.name: HashingEmbeddingProvider,
+}
+
+_providers: Dict[str, EmbeddingProvider] = {}
+
+def get_embedding_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """Shared provider instance by name (defaults to the configured provider)"""
+    name = name or settings.embedding_provider
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider: {name}")
+    # Created on first use, so the OpenAI tokenizer and client aren't needed by offline runs
+    if name not in _providers:
+        _providers[name] = EMBEDDING_PROVIDERS[name]()
+    return _providers[name]
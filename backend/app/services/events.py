@@ -0,0 +1,42 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+class TaskEventBus:
+    """In-process publish/subscribe for task status updates.
+
+    Every subscriber gets its own bounded queue. A slow subscriber loses its
+    oldest updates rather than blocking the publisher; the newest state, which
+    is all a progress display needs, is always delivered.
+    """
+
+    def __init__(self, max_queue_size: int = 100):
+        self.max_queue_size = max_queue_size
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        """Start receiving updates for a task"""
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.subscribers[task_id].add(queue)
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        """Stop receiving updates for a task"""
+        queues = self.subscribers.get(task_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[task_id]
+
+    def publish(self, task_id: str, event: Dict[str, Any]):
+        """Deliver an update to every subscriber of the task without waiting"""
+        for queue in self.subscribers.get(task_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+task_events = TaskEventBus()
@@ -0,0 +1,98 @@
+import time
+import asyncio
+import logging
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.services.storage import StorageService
+from app.services.jobs import job_queue, JobCancelled
+from app.utils.metrics import begin_stage
+
+logger = logging.getLogger(__name__)
+
+class IngestionService:
+    """Imports uploads that are too slow to convert within the upload request (Excel workbooks)"""
+
+    def __init__(self):
+        self.storage = StorageService()
+        self.uploads_dir = settings.data_dir / "temp"
+
+    async def create_task(self, task_id: str, upload_path: Path, filename: str,
+                          description: Optional[str] = None, sheet: Optional[str] = None) -> Dict[str, Any]:
+        """Queue the import of an uploaded workbook; the job takes ownership of the upload file.
+        
+        The upload is kept until the import succeeds, so failed, cancelled or
+        interrupted imports can be retried; prune_uploads removes the ones left behind.
+        """
+        params = {"path": str(upload_path), "filename": filename, "description": description, "sheet": sheet}
+        # Jobs are keyed by their input; here that's the upload itself
+        return await job_queue.enqueue(task_id, "ingestion", upload_path.stem, params)
+
+    async def run_job(self, task_id: str, upload_id: str, params: Dict[str, Any]):
+        """Job queue handler: stream an Excel sheet into a new dataset, reporting rows ingested"""
+        source_path = Path(params["path"])
+        filename = params["filename"]
+        try:
+            begin_stage("ingestion")
+            if not source_path.exists():
+                raise ValueError("The uploaded file is no longer available, please upload it again")
+            sheet = self.storage.resolve_sheet(
+                await asyncio.to_thread(self.storage.excel_sheet_names, source_path), params.get("sheet")
+            )
+            await job_queue.update(task_id, "processing", 5, f"Reading sheet '{sheet}' of {filename}...")
+
+            dataset_id, file_path = self.storage.new_dataset_path(filename)
+            rows = 0
+            converter = self.storage.excel_row_groups(source_path, file_path, sheet)
+            step = None
+            try:
+                while True:
+                    # Shielded so a cancelled job still lets the batch being read finish
+                    step = asyncio.ensure_future(asyncio.to_thread(next, converter, None))
+                    progress = await asyncio.shield(step)
+                    if progress is None:
+                        break
+                    rows, estimated = progress
+                    percent = 5 + int(90 * min(rows / estimated, 1)) if estimated else 50
+                    await job_queue.update(task_id, "processing", percent, f"Ingesting Excel... {rows:,} rows")
+            finally:
+                if step is not None and not step.done():
+                    await asyncio.wait([step])
+                # Closing an unfinished converter removes its partial output
+                await asyncio.to_thread(converter.close)
+
+            columns = (await asyncio.to_thread(pq.read_metadata, file_path)).num_columns
+            await self.storage.register_dataset(dataset_id, filename, file_path, rows, columns, params.get("description"))
+            await job_queue.update(
+                task_id, "completed", 100,
+                f"Ingested {rows:,} rows from sheet '{sheet}'.",
+                dataset_id,
+                {"sheet": sheet, "rows": rows, "columns": columns}
+            )
+            logger.info(f"Task {task_id}: ingested {rows} rows of {filename} into {dataset_id}")
+            source_path.unlink(missing_ok=True)
+
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Task {task_id}: Ingestion failed - {str(e)}")
+            await job_queue.update(task_id, "failed", 0, f"Ingestion failed: {str(e)}")
+    
+    def prune_uploads(self, max_age_hours: Optional[float] = None) -> int:
+        """Remove uploads of imports that didn't succeed and haven't been retried for max_age_hours"""
+        max_age_hours = settings.checkpoint_retention_hours if max_age_hours is None else max_age_hours
+        if not self.uploads_dir.exists():
+            return 0
+        
+        cutoff = time.time() - max_age_hours * 3600
+        removed = 0
+        for path in self.uploads_dir.iterdir():
+            # The directory also holds the compute pool's shared matrices
+            if path.suffix in settings.allowed_extensions and path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} old upload(s)")
+        return removed
@@ -0,0 +1,407 @@
+import os
+import json
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.services.events import task_events
+from app.services.database import Database, database
+from app.utils.metrics import TaskMetrics, current_metrics
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+JobHandler = Callable[[str, str, Dict[str, Any]], Awaitable[None]]
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested"""
+
+class JobQueue:
+    """Durable job queue backed by the application's SQLite database.
+
+    Every API worker process runs a dispatcher that claims pending jobs, so
+    status survives restarts and can be read from any process. The number of
+    jobs running at once is bounded across all processes; job types registered
+    with their own limit (e.g. ingestion) don't take slots from the others.
+    """
+
+    def __init__(self, db: Optional[Database] = None):
+        self.db = db or database
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.handlers: Dict[str, JobHandler] = {}
+        # Job types with their own concurrency limit; the others share max_concurrent_jobs
+        self.limits: Dict[str, int] = {}
+        self.running: Dict[str, asyncio.Task] = {}
+        self.metrics: Dict[str, TaskMetrics] = {}
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Set while shutting down, so jobs cancelled by stop() are re-queued instead of cancelled
+        self._stopping = False
+
+    def register(self, job_type: str, handler: JobHandler, max_concurrent: Optional[int] = None):
+        """Register the coroutine that executes jobs of a given type, optionally with its own concurrency limit"""
+        self.handlers[job_type] = handler
+        if max_concurrent is not None:
+            self.limits[job_type] = max_concurrent
+    
+    @property
+    def capacity(self) -> int:
+        """Most jobs that can run at once"""
+        return settings.max_concurrent_jobs + sum(self.limits.values())
+
+    async def initialize(self):
+        """Create the jobs table"""
+        async with self.db.write() as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    task_id TEXT PRIMARY KEY,
+                    job_type TEXT NOT NULL,
+                    dataset_id TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    result TEXT,
+                    details TEXT,
+                    metrics TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            # Databases created before per-stage metrics were recorded
+            columns = await db.execute_fetchall("PRAGMA table_info(jobs)")
+            if "metrics" not in [column[1] for column in columns]:
+                await db.execute("ALTER TABLE jobs ADD COLUMN metrics TEXT")
+
+    async def start(self):
+        """Recover interrupted jobs and start dispatching"""
+        await self.initialize()
+        self._stopping = False
+        # Events bind to the loop they are first used on, and a restarted app runs a new one
+        self._wakeup = asyncio.Event()
+        await self.fail_stale_jobs()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"Job queue started ({self.worker_id}, max {settings.max_concurrent_jobs} concurrent jobs, limits {self.limits})")
+
+    async def stop(self):
+        """Stop dispatching; jobs running in this process are interrupted and put back in the queue"""
+        self._stopping = True
+        for task in [self._dispatcher, self._heartbeat, *self.running.values()]:
+            if task:
+                task.cancel()
+        await asyncio.gather(*self.running.values(), return_exceptions=True)
+        logger.info("Job queue stopped")
+
+    # ----- Job records -----
+
+    async def enqueue(self, task_id: str, job_type: str, dataset_id: str,
+                      params: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist a new pending job"""
+        now = datetime.now().isoformat()
+        async with self.db.write() as db:
+            await db.execute("""
+                INSERT INTO jobs (task_id, job_type, dataset_id, params, status, progress, message,
+                                  created_at, updated_at)
+                VALUES (?, ?, ?, ?, 'pending', 0, ?, ?, ?)
+            """, (task_id, job_type, dataset_id, json.dumps(params),
+                  "Task queued, waiting for a free worker...", now, now))
+
+        logger.info(f"Task {task_id} queued")
+        self._wakeup.set()
+        return await self.get(task_id)
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's state"""
+        async with self.db.read() as db:
+            jobs = await self._select(db, "SELECT * FROM jobs WHERE task_id = ?", (task_id,))
+        return jobs[0] if jobs else None
+
+    async def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """List recent jobs, optionally filtered by status"""
+        query = "SELECT * FROM jobs"
+        args: list = []
+        if status:
+            query += " WHERE status = ?"
+            args.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+
+        async with self.db.read() as db:
+            return await self._select(db, query, args)
+
+    async def update(self, task_id: str, status: str, progress: int, message: str,
+                     result: Optional[str] = None, details: Optional[Dict[str, Any]] = None):
+        """Record progress of a job.
+
+        Raises JobCancelled when cancellation was requested, so running jobs
+        stop at their next progress update. Called from inside a job, the job's
+        per-stage metrics are saved along with the progress.
+        """
+        now = datetime.now().isoformat()
+        metrics = current_metrics.get()
+        metrics = metrics.snapshot() if metrics is not None else None
+        async with self.db.write() as db:
+            rows = await db.execute_fetchall("SELECT cancel_requested FROM jobs WHERE task_id = ?", (task_id,))
+            if rows and rows[0][0] and status not in TERMINAL_STATUSES:
+                raise JobCancelled(task_id)
+
+            await db.execute("""
+                UPDATE jobs
+                SET status = ?, progress = ?, message = ?, result = ?, details = ?,
+                    metrics = COALESCE(?, metrics), updated_at = ?,
+                    finished_at = CASE WHEN ? IN ('completed', 'failed', 'cancelled') THEN ? ELSE finished_at END
+                WHERE task_id = ?
+            """, (status, progress, message, result,
+                  json.dumps(details) if details is not None else None,
+                  json.dumps(metrics) if metrics is not None else None, now,
+                  status, now, task_id))
+
+        task_events.publish(task_id, {
+            "task_id": task_id, "status": status, "progress": progress, "message": message,
+            "result": result, "details": details, "updated_at": now, "timestamp": now,
+            **({"metrics": metrics} if metrics is not None else {})
+        })
+
+    async def cancel(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a pending job immediately or ask a running one to stop"""
+        now = datetime.now().isoformat()
+        async with self.db.write() as db:
+            await db.execute("""
+                UPDATE jobs SET status = 'cancelled', message = 'Task cancelled', finished_at = ?, updated_at = ?
+                WHERE task_id = ? AND status = 'pending'
+            """, (now, now, task_id))
+            await db.execute("""
+                UPDATE jobs SET cancel_requested = 1, message = 'Cancellation requested...', updated_at = ?
+                WHERE task_id = ? AND status = 'processing'
+            """, (now, task_id))
+
+        # Jobs running in this process stop right away; others at their next progress update
+        if task_id in self.running:
+            self.running[task_id].cancel()
+        return await self._publish_state(task_id)
+
+    async def retry(self, task_id: str, message: str = "Task re-queued for retry...") -> Optional[Dict[str, Any]]:
+        """Put a failed or cancelled job back in the queue"""
+        now = datetime.now().isoformat()
+        async with self.db.write() as db:
+            await db.execute("""
+                UPDATE jobs
+                SET status = 'pending', progress = 0, message = ?,
+                    result = NULL, metrics = NULL, cancel_requested = 0, worker_id = NULL,
+                    started_at = NULL, finished_at = NULL, updated_at = ?
+                WHERE task_id = ? AND status IN ('failed', 'cancelled')
+            """, (message, now, task_id))
+
+        self._wakeup.set()
+        return await self._publish_state(task_id)
+
+    async def watch(self, task_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a job's state now and after every change, until it finishes.
+
+        Updates from jobs running in this process are pushed through the event
+        bus as they happen. Jobs running in another worker process are picked up
+        by re-reading the row every task_event_fallback_interval seconds.
+        """
+        queue = task_events.subscribe(task_id)
+        try:
+            job = await self.get(task_id)
+            if job is None:
+                return
+            while True:
+                yield job
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.task_event_fallback_interval)
+                    job = {**job, **event}
+                except asyncio.TimeoutError:
+                    job = await self.get(task_id) or job
+        finally:
+            task_events.unsubscribe(task_id, queue)
+
+    async def _publish_state(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Read a job and push its full state to subscribers"""
+        job = await self.get(task_id)
+        if job is not None:
+            task_events.publish(task_id, job)
+        return job
+
+    async def _requeue(self, task_id: str, message: str):
+        """Put an interrupted job back in the queue; it resumes from its checkpoints when claimed again"""
+        now = datetime.now().isoformat()
+        async with self.db.write() as db:
+            await db.execute("""
+                UPDATE jobs
+                SET status = 'pending', message = ?, worker_id = NULL, started_at = NULL, updated_at = ?
+                WHERE task_id = ? AND status = 'processing'
+            """, (message, now, task_id))
+        await self._publish_state(task_id)
+    
+    async def fail_stale_jobs(self):
+        """Re-queue running jobs whose worker stopped sending heartbeats (e.g. after a crash).
+        
+        Jobs that were already interrupted job_max_attempts times are marked as
+        failed instead, so a job that keeps killing its worker can't loop forever.
+        """
+        cutoff = (datetime.now() - timedelta(seconds=settings.job_stale_after)).isoformat()
+        now = datetime.now().isoformat()
+        async with self.db.write() as db:
+            failed = await db.execute("""
+                UPDATE jobs
+                SET status = 'failed', message = 'Task interrupted too many times (worker stopped responding)',
+                    finished_at = ?, updated_at = ?
+                WHERE status = 'processing' AND updated_at < ? AND attempts >= ?
+            """, (now, now, cutoff, settings.job_max_attempts))
+            requeued = await db.execute("""
+                UPDATE jobs
+                SET status = 'pending', message = 'Task interrupted (worker stopped responding), re-queued to resume...',
+                    worker_id = NULL, started_at = NULL, updated_at = ?
+                WHERE status = 'processing' AND updated_at < ?
+            """, (now, cutoff))
+            if failed.rowcount:
+                logger.warning(f"Marked {failed.rowcount} repeatedly interrupted job(s) as failed")
+            if requeued.rowcount:
+                logger.warning(f"Re-queued {requeued.rowcount} interrupted job(s)")
+        if requeued.rowcount:
+            self._wakeup.set()
+
+    # ----- Dispatching -----
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest pending job whose type is within its global concurrency limit"""
+        now = datetime.now().isoformat()
+        async with self.db.write() as db:
+            # BEGIN IMMEDIATE takes the write lock, so two processes can't claim the same job
+            await db.execute("BEGIN IMMEDIATE")
+            counts = dict(await db.execute_fetchall(
+                "SELECT job_type, COUNT(*) FROM jobs WHERE status = 'processing' GROUP BY job_type"
+            ))
+            shared = sum(n for job_type, n in counts.items() if job_type not in self.limits)
+            open_types = [job_type for job_type, limit in self.limits.items() if counts.get(job_type, 0) < limit]
+            
+            conditions = []
+            if open_types:
+                conditions.append(f"job_type IN ({', '.join('?' * len(open_types))})")
+            if shared < settings.max_concurrent_jobs:
+                conditions.append(f"job_type NOT IN ({', '.join('?' * len(self.limits))})")
+            if not conditions:
+                return None
+            rows = await db.execute_fetchall(
+                f"SELECT task_id FROM jobs WHERE status = 'pending' AND ({' OR '.join(conditions)}) "
+                "ORDER BY created_at LIMIT 1",
+                (*open_types, *(self.limits if shared < settings.max_concurrent_jobs else ()))
+            )
+            if not rows:
+                return None
+            task_id = rows[0][0]
+
+            await db.execute("""
+                UPDATE jobs
+                SET status = 'processing', message = 'Task started', attempts = attempts + 1,
+                    worker_id = ?, started_at = ?, updated_at = ?
+                WHERE task_id = ?
+            """, (self.worker_id, now, now, task_id))
+            return (await self._select(db, "SELECT * FROM jobs WHERE task_id = ?", (task_id,)))[0]
+
+    async def _dispatch_loop(self):
+        """Claim and start jobs until this process is at capacity"""
+        while True:
+            try:
+                while len(self.running) < self.capacity:
+                    job = await self._claim()
+                    if job is None:
+                        break
+                    self.running[job["task_id"]] = asyncio.create_task(self._run(job))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job dispatcher error: {e}")
+
+            # Wake up when a job is queued locally, otherwise poll for jobs queued by other processes
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.job_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job: Dict[str, Any]):
+        """Execute one claimed job with its registered handler"""
+        task_id = job["task_id"]
+        # Stage metrics are collected in the job's own context (this task and any it spawns)
+        self.metrics[task_id] = TaskMetrics()
+        current_metrics.set(self.metrics[task_id])
+        try:
+            handler = self.handlers.get(job["job_type"])
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job type '{job['job_type']}'")
+            await handler(task_id, job["dataset_id"], job["params"])
+        except (asyncio.CancelledError, JobCancelled) as e:
+            current = await self.get(task_id)
+            if self._stopping and isinstance(e, asyncio.CancelledError) and current and not current["cancel_requested"]:
+                # Interrupted by a shutdown or restart, not by the user: the next start picks it up again
+                logger.info(f"Task {task_id} interrupted by shutdown, re-queued")
+                await self._requeue(task_id, "Task interrupted by a server restart, re-queued to resume...")
+            else:
+                logger.info(f"Task {task_id} cancelled")
+                await self.update(task_id, "cancelled", job["progress"], "Task cancelled")
+        except Exception as e:
+            logger.error(f"Task {task_id}: job failed - {str(e)}")
+            await self.update(task_id, "failed", 0, f"Task failed: {str(e)}")
+        finally:
+            self.running.pop(task_id, None)
+            self.metrics.pop(task_id, None)
+            self._wakeup.set()
+
+    async def _heartbeat_loop(self):
+        """Keep locally running jobs (and their metrics) fresh and fail jobs abandoned by dead workers"""
+        while True:
+            await asyncio.sleep(settings.job_heartbeat_interval)
+            try:
+                if self.running:
+                    now = datetime.now().isoformat()
+                    # Long stages send no progress updates, so metrics are refreshed here too
+                    rows = [(json.dumps(self.metrics[task_id].snapshot()) if task_id in self.metrics else None,
+                             now, task_id) for task_id in list(self.running)]
+                    async with self.db.write() as db:
+                        await db.executemany(
+                            "UPDATE jobs SET metrics = COALESCE(?, metrics), updated_at = ? WHERE task_id = ?",
+                            rows
+                        )
+                await self.fail_stale_jobs()
+            except Exception as e:
+                logger.error(f"Job heartbeat error: {e}")
+
+    @classmethod
+    async def _select(cls, db, query: str, args=()) -> List[Dict[str, Any]]:
+        """Run a query on the jobs table and convert the rows to task status payloads"""
+        cursor = await db.execute(query, args)
+        try:
+            columns = [column[0] for column in cursor.description]
+            return [cls._to_dict(zip(columns, row)) for row in await cursor.fetchall()]
+        finally:
+            await cursor.close()
+
+    @staticmethod
+    def _to_dict(row) -> Dict[str, Any]:
+        """Convert a jobs row (column/value pairs) to the task status payload"""
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["details"] = json.loads(job["details"]) if job["details"] else None
+        job["metrics"] = json.loads(job["metrics"]) if job.get("metrics") else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["timestamp"] = job["updated_at"]
+        return job
+
+job_queue = JobQueue()
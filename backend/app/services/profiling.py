@@ -0,0 +1,230 @@
+import os
+import math
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+PROFILE_VERSION = 1
+MAX_TEXT = 200  # characters kept of text values (min/max, top values)
+
+def pandas_dtypes(schema: pa.Schema) -> Dict[str, str]:
+    """Pandas dtypes of a parquet file's columns, from its schema alone"""
+    # An empty table carries the pandas metadata, so index columns are left out as in read_parquet
+    return schema.empty_table().to_pandas().dtypes.astype(str).to_dict()
+
+def _json_value(value: Any) -> Any:
+    """Make a column value JSON-safe"""
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, str) and len(value) > MAX_TEXT:
+        return value[:MAX_TEXT] + "..."
+    return value
+
+class ColumnProfiler:
+    """Accumulates one column's statistics over the row groups of a file.
+
+    Distinct counts come from a KMV sketch (the k smallest 64-bit hashes of the
+    values seen), exact up to k distinct values. Top values keep a bounded set
+    of candidates, so their counts are exact unless the column has more
+    distinct values than fit in it; columns whose first row group is all
+    distinct values (IDs, free text) stop tracking them.
+    """
+
+    def __init__(self, name: str, dtype: str, arrow_type: pa.DataType):
+        self.name = name
+        self.dtype = dtype
+        if pa.types.is_dictionary(arrow_type):
+            arrow_type = arrow_type.value_type
+        self.arrow_type = arrow_type
+        self.nested = pa.types.is_nested(arrow_type)
+        self.is_text = pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+        self.is_numeric = pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type)
+        # Top values are only meaningful for columns of discrete values
+        self.track_top = self.is_text or pa.types.is_boolean(arrow_type) or pa.types.is_integer(arrow_type)
+        self.orderable = (self.is_numeric or self.is_text or pa.types.is_timestamp(arrow_type)
+                          or pa.types.is_date(arrow_type) or pa.types.is_time(arrow_type))
+
+        self.rows = 0
+        self.null_count = 0
+        self.sketch = np.empty(0, dtype=np.uint64)
+        self.min = self.max = None
+        self.candidates: Dict[Any, int] = {}
+        # Count, mean and sum of squared deviations, merged across row groups
+        self.moments = (0, 0.0, 0.0)
+        self.length = {"min": None, "max": None, "sum": 0, "count": 0}
+
+    def update(self, column: pa.ChunkedArray):
+        """Add a row group's values"""
+        column = column.combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            column = column.dictionary_decode()
+        self.rows += len(column)
+        self.null_count += column.null_count
+        if self.nested or column.null_count == len(column):
+            return
+
+        if self.track_top:
+            counts = pc.value_counts(column)
+            values, frequencies = counts.field("values"), counts.field("counts").to_numpy()
+            if frequencies.max() == 1 and not any(n > 1 for n in self.candidates.values()):
+                # Every value so far is unique (an ID column): there are no top values to find
+                self.track_top = False
+                self.candidates = {}
+            else:
+                n_keep = min(settings.profile_top_candidates, len(frequencies))
+                keep = np.argpartition(-frequencies, n_keep - 1)[:n_keep]
+                for value, count in zip(values.take(pa.array(keep)).to_pylist(), frequencies[keep].tolist()):
+                    if value is not None:
+                        self.candidates[value] = self.candidates.get(value, 0) + count
+                if len(self.candidates) > settings.profile_top_candidates:
+                    kept = sorted(self.candidates.items(), key=lambda item: -item[1])[:settings.profile_top_candidates]
+                    self.candidates = dict(kept)
+        else:
+            values = pc.unique(column)
+        self._update_sketch(values.drop_null())
+
+        if self.orderable:
+            extremes = pc.min_max(column)
+            low, high = extremes["min"].as_py(), extremes["max"].as_py()
+            if low is not None:
+                self.min = low if self.min is None else min(self.min, low)
+                self.max = high if self.max is None else max(self.max, high)
+
+        if self.is_numeric:
+            numbers = pc.cast(column, pa.float64()).drop_null()
+            n = len(numbers)
+            if n:
+                mean = pc.mean(numbers).as_py()
+                m2 = pc.variance(numbers, ddof=0).as_py() * n
+                self._merge_moments(n, mean, m2)
+
+        if self.is_text:
+            lengths = pc.utf8_length(column)
+            extremes = pc.min_max(lengths)
+            low, high = extremes["min"].as_py(), extremes["max"].as_py()
+            length = self.length
+            length["min"] = low if length["min"] is None else min(length["min"], low)
+            length["max"] = high if length["max"] is None else max(length["max"], high)
+            length["sum"] += pc.sum(lengths).as_py()
+            length["count"] += len(lengths) - lengths.null_count
+
+    def _update_sketch(self, values: pa.Array):
+        k = settings.profile_sketch_size
+        if self.is_text:
+            # Same hashes as str values, but bytes objects are much cheaper to create
+            values = values.cast(pa.large_binary() if pa.types.is_large_string(values.type) else pa.binary())
+        # The values are already distinct within the row group, so no need to factorize them first
+        hashes = pd.util.hash_array(values.to_numpy(zero_copy_only=False), categorize=False)
+        if len(hashes) > k:
+            hashes = np.partition(hashes, k - 1)[:k]
+        # union1d sorts and drops duplicates, so the sketch stays the k smallest distinct hashes
+        self.sketch = np.union1d(self.sketch, hashes)[:k]
+
+    def _merge_moments(self, n: int, mean: float, m2: float):
+        # Chan et al.'s parallel update
+        count, current_mean, current_m2 = self.moments
+        total = count + n
+        delta = mean - current_mean
+        self.moments = (
+            total,
+            current_mean + delta * n / total,
+            current_m2 + m2 + delta * delta * count * n / total
+        )
+
+    def distinct(self) -> Optional[int]:
+        if self.nested:
+            return None
+        k = settings.profile_sketch_size
+        if len(self.sketch) < k:
+            return len(self.sketch)
+        # The k-th smallest of n uniform hashes sits near k / n of the hash range
+        return int(round((k - 1) * 2.0 ** 64 / float(self.sketch[k - 1])))
+
+    def result(self) -> Dict[str, Any]:
+        count, mean, m2 = self.moments
+        length = self.length
+        # Values seen once (e.g. in an ID column) aren't "top" values
+        top = [item for item in sorted(self.candidates.items(), key=lambda item: -item[1])
+               if item[1] > 1][:settings.profile_top_values]
+        return {
+            "name": self.name,
+            "dtype": self.dtype,
+            "arrow_type": str(self.arrow_type),
+            "null_count": self.null_count,
+            "distinct_count": self.distinct(),
+            "distinct_exact": self.nested or len(self.sketch) < settings.profile_sketch_size,
+            "min": _json_value(self.min),
+            "max": _json_value(self.max),
+            "mean": _json_value(mean) if count else None,
+            "std": _json_value(math.sqrt(m2 / (count - 1))) if count > 1 else None,
+            "top_values": [{"value": _json_value(value), "count": n} for value, n in top],
+            "text_length": {
+                "min": length["min"],
+                "max": length["max"],
+                "mean": length["sum"] / length["count"]
+            } if self.is_text and length["count"] else None
+        }
+
+def profile_parquet(file_path: Path) -> Dict[str, Any]:
+    """Profile a parquet dataset one row group at a time (runs in a worker thread)"""
+    started = time.perf_counter()
+    with pq.ParquetFile(file_path) as parquet:
+        schema = parquet.schema_arrow
+        dtypes = pandas_dtypes(schema)
+        profilers = [ColumnProfiler(name, dtype, schema.field(name).type) for name, dtype in dtypes.items()]
+        # Most of the work is in pyarrow kernels that release the GIL, so columns are profiled in parallel
+        with ThreadPoolExecutor(max_workers=max(1, min(len(profilers), os.cpu_count() or 1))) as executor:
+            for i in range(parquet.num_row_groups):
+                row_group = parquet.read_row_group(i, columns=list(dtypes))
+                list(executor.map(lambda profiler: profiler.update(row_group.column(profiler.name)), profilers))
+        rows, row_groups = parquet.metadata.num_rows, parquet.num_row_groups
+
+    return {
+        "version": PROFILE_VERSION,
+        "rows": rows,
+        "row_groups": row_groups,
+        "columns": [profiler.result() for profiler in profilers],
+        "computed_at": datetime.now().isoformat(),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+def describe_profile(profile: Dict[str, Any]) -> str:
+    """Plain-text summary of a profile, for LLM prompts"""
+    lines = [f"{profile['rows']:,} rows, {len(profile['columns'])} columns:"]
+    for column in profile["columns"]:
+        parts = [f"{column['null_count']:,} nulls"]
+        if column["distinct_count"] is not None:
+            approx = "" if column["distinct_exact"] else "~"
+            parts.append(f"{approx}{column['distinct_count']:,} distinct")
+        if column["min"] is not None and not column["text_length"]:
+            parts.append(f"range {column['min']} to {column['max']}")
+        if column["mean"] is not None:
+            parts.append(f"mean {column['mean']:,.6g}")
+        if column["text_length"]:
+            parts.append(f"text length {column['text_length']['min']}-{column['text_length']['max']} "
+                         f"(mean {column['text_length']['mean']:.0f})")
+        if column["top_values"]:
+            values = [(item["value"][:40] if isinstance(item["value"], str) else item["value"], item["count"])
+                      for item in column["top_values"][:5]]
+            top = ", ".join(f"{value!r} ({count:,})" for value, count in values)
+            parts.append(f"top values {top}")
+        lines.append(f"- {column['name']} ({column['dtype']}): " + "; ".join(parts))
+    return "\n".join(lines)
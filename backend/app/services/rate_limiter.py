@@ -0,0 +1,62 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Token-bucket limiter for requests-per-minute and tokens-per-minute quotas.
+
+    A single instance is shared by every caller hitting the same API so that
+    concurrent batches stay within the account limits together.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+
+        self.available_requests = self.request_capacity
+        self.available_tokens = self.token_capacity
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Top up both buckets for the time elapsed since the last refill"""
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.available_requests = min(self.request_capacity, self.available_requests + elapsed * self.request_rate)
+        self.available_tokens = min(self.token_capacity, self.available_tokens + elapsed * self.token_rate)
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until one request carrying the given number of tokens may be sent"""
+        # A single request larger than the whole bucket would otherwise never fit
+        tokens = min(float(tokens), self.token_capacity)
+
+        # Holding the lock while waiting keeps callers served in FIFO order
+        async with self._lock:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+
+                self._refill()
+                if self.available_requests >= 1 and self.available_tokens >= tokens:
+                    self.available_requests -= 1
+                    self.available_tokens -= tokens
+                    return
+
+                wait = max(
+                    (1 - self.available_requests) / self.request_rate,
+                    (tokens - self.available_tokens) / self.token_rate,
+                )
+                await asyncio.sleep(max(wait, 0.01))
+
+    def pause(self, seconds: float):
+        """Stop all callers for a while, e.g. after the API answers 429"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        logger.warning(f"Rate limited by API, pausing requests for {seconds:.1f}s")
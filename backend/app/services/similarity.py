@@ -0,0 +1,170 @@
+import heapq
+import asyncio
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.storage import StorageService
+from app.services.compute_pool import compute_pool
+from app.services.clustering_compute import build_ivf_index
+
+logger = logging.getLogger(__name__)
+
+class VectorIndex:
+    """A dataset's memory-mapped IVF index, opened once and shared by all queries"""
+
+    def __init__(self, index_path, meta_path):
+        self.vectors = np.load(index_path, mmap_mode='r')
+        with np.load(meta_path) as meta:
+            self.row_ids = meta["row_ids"]
+            self.offsets = meta["offsets"]
+            self.centroids = meta["centroids"]
+        self.n_lists = len(self.centroids)
+        # Dataset columns used to resolve ticket ids and describe results, loaded on first use
+        self.frames: Dict[str, pd.DataFrame] = {}
+        self.lookups: Dict[str, pd.Index] = {}
+
+    def search(self, query: np.ndarray, top_k: int, nprobe: int,
+               exclude_row: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return (dataset row, cosine similarity) of the top_k rows closest to a normalized query"""
+        if len(self.vectors) <= settings.similarity_exact_max_rows or nprobe >= self.n_lists:
+            ranges = [(0, len(self.vectors))]
+        else:
+            probe = np.argpartition(-(self.centroids @ query), nprobe)[:nprobe]
+            ranges = [(self.offsets[l], self.offsets[l + 1]) for l in probe]
+
+        # Keep one extra candidate in case the query row itself is among them
+        keep = top_k + (exclude_row is not None)
+        candidates = []
+        block = settings.similarity_block_rows
+        for start, end in ranges:
+            for block_start in range(start, end, block):
+                scores = self.vectors[block_start:min(block_start + block, end)] @ query
+                if len(scores) > keep:
+                    top = np.argpartition(-scores, keep)[:keep]
+                else:
+                    top = np.arange(len(scores))
+                candidates.extend(zip(scores[top].tolist(), (top + block_start).tolist()))
+
+        results = []
+        for score, position in heapq.nlargest(keep, candidates):
+            row = int(self.row_ids[position])
+            if row != exclude_row:
+                results.append((row, score))
+        return results[:top_k]
+
+class SimilarityService:
+    """Nearest-neighbour search over the stored embeddings of clustered datasets"""
+
+    def __init__(self):
+        self.storage = StorageService()
+        # Open indexes by (meta file mtime, index), least recently used first
+        self.indexes: "OrderedDict[str, Tuple[float, VectorIndex]]" = OrderedDict()
+        # Per dataset, so building one dataset's index doesn't hold up searches on the others
+        self._build_locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, dataset_id: str) -> asyncio.Lock:
+        return self._build_locks.setdefault(dataset_id, asyncio.Lock())
+
+    async def build_index(self, dataset_id: str) -> Optional[int]:
+        """Build (or rebuild) a dataset's index from its embeddings; returns the number of lists"""
+        async with self._lock(dataset_id):
+            return await self._build_index(dataset_id)
+
+    async def _build_index(self, dataset_id: str) -> Optional[int]:
+        embeddings = await self.storage.load_embeddings(dataset_id)
+        if embeddings is None:
+            return None
+
+        file_path = await self.storage.get_dataset_path(dataset_id)
+        columns = pq.read_schema(file_path).names
+        if 'cluster' in columns:
+            # Seed the index lists from the clustering
+            labels = (await asyncio.to_thread(pq.read_table, file_path, columns=['cluster']))['cluster'].to_numpy()
+        else:
+            labels = np.zeros(len(embeddings), dtype=np.int64)
+
+        index_path, meta_path = self.storage.vector_index_paths(dataset_id)
+        n_lists = await compute_pool.run(
+            build_ivf_index, str(self.storage.embeddings_path(dataset_id)), labels,
+            str(index_path), str(meta_path), settings.similarity_list_size
+        )
+        self.indexes.pop(dataset_id, None)
+        logger.info(f"Similarity index built for {dataset_id}: {len(embeddings)} rows in {n_lists} lists")
+        return n_lists
+
+    async def get_index(self, dataset_id: str) -> Optional[VectorIndex]:
+        """Open a dataset's index, building it first if it is missing or older than the embeddings"""
+        embeddings_path = self.storage.embeddings_path(dataset_id)
+        index_path, meta_path = self.storage.vector_index_paths(dataset_id)
+
+        async with self._lock(dataset_id):
+            if not embeddings_path.exists() and await self.storage.load_embeddings(dataset_id) is None:
+                return None
+            if not meta_path.exists() or meta_path.stat().st_mtime < embeddings_path.stat().st_mtime:
+                await self._build_index(dataset_id)
+
+            mtime = meta_path.stat().st_mtime
+            cached = self.indexes.get(dataset_id)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, await asyncio.to_thread(VectorIndex, index_path, meta_path))
+                self.indexes[dataset_id] = cached
+            self.indexes.move_to_end(dataset_id)
+            # Searches already holding an evicted index keep using it until they finish
+            while len(self.indexes) > settings.similarity_max_open_indexes:
+                self.indexes.popitem(last=False)
+        return cached[1]
+
+    def invalidate(self, dataset_id: str):
+        """Drop a dataset's open index (e.g. when the dataset is deleted)"""
+        self.indexes.pop(dataset_id, None)
+        lock = self._build_locks.get(dataset_id)
+        if lock is not None and not lock.locked():
+            del self._build_locks[dataset_id]
+
+    async def load_frame(self, dataset_id: str, index: VectorIndex, id_column: str) -> pd.DataFrame:
+        """Columns returned with search results, cached on the index"""
+        if id_column not in index.frames:
+            file_path = await self.storage.get_dataset_path(dataset_id)
+            names = pq.read_schema(file_path).names
+            if id_column not in names:
+                raise KeyError(id_column)
+            columns = [id_column] + [c for c in ('clean_desc', 'cluster', 'cluster_title') if c in names and c != id_column]
+            index.frames[id_column] = await asyncio.to_thread(pd.read_parquet, file_path, columns=columns)
+        return index.frames[id_column]
+
+    async def find_row(self, dataset_id: str, index: VectorIndex, id_column: str, ticket_id: str) -> Optional[int]:
+        """Dataset row of a ticket id, or None if it isn't in the dataset"""
+        if id_column not in index.lookups:
+            frame = await self.load_frame(dataset_id, index, id_column)
+            index.lookups[id_column] = pd.Index(frame[id_column].astype(str))
+        lookup = index.lookups[id_column]
+        if ticket_id not in lookup:
+            return None
+        position = lookup.get_loc(ticket_id)
+        # Duplicate ids resolve to their first row
+        if not isinstance(position, int):
+            position = int(np.flatnonzero(position)[0]) if isinstance(position, np.ndarray) else position.start
+        return position
+
+    async def search(self, dataset_id: str, index: VectorIndex, query: np.ndarray, id_column: str,
+                     top_k: int = 10, nprobe: Optional[int] = None,
+                     exclude_row: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Find the rows most similar to an embedding and describe them"""
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        nprobe = nprobe or settings.similarity_nprobe
+        hits = await asyncio.to_thread(index.search, query, top_k, nprobe, exclude_row)
+
+        frame = await self.load_frame(dataset_id, index, id_column)
+        records = frame.iloc[[row for row, _ in hits]].to_dict('records')
+        return [
+            {"row": row, "score": round(score, 6), **record}
+            for (row, score), record in zip(hits, records)
+        ]
+
+similarity_service = SimilarityService()
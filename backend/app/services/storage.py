@@ -1,203 +1,678 @@
-import os
-import json
-import aiosqlite
-import pandas as pd
-from datetime import datetime
-from pathlib import Path
-from typing import List, Optional
-import asyncio
-import logging
-
-from app.config import settings
-from app.schema.file import FileInfo
-
-logger = logging.getLogger(__name__)
-
-class StorageService:
-    """Handle all storage operations using SQLite"""
-    
-    def __init__(self):
-        self.db_path = settings.data_dir / "app.db"
-        self.datasets_dir = settings.data_dir / "datasets"
-        
-    async def initialize(self):
-        """Initialize the storage system"""
-        # Create directories
-        self.datasets_dir.mkdir(exist_ok=True)
-        
-        # Initialize database
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS datasets (
-                    dataset_id TEXT PRIMARY KEY,
-                    filename TEXT NOT NULL,
-                    upload_date TEXT NOT NULL,
-                    rows INTEGER NOT NULL,
-                    columns INTEGER NOT NULL,
-                    size_mb REAL NOT NULL,
-                    description TEXT,
-                    file_path TEXT NOT NULL
-                )
-            """)
-            
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS chat_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    dataset_id TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp TEXT NOT NULL,
-                    FOREIGN KEY (dataset_id) REFERENCES datasets (dataset_id)
-                )
-            """)
-            
-            await db.commit()
-            
-        logger.info("Storage system initialized")
-    
-    async def save_dataset(self, df: pd.DataFrame, filename: str, description: Optional[str] = None) -> str:
-        """Save dataset to storage"""
-        # Generate unique ID
-        dataset_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename.replace('.', '_')}"
-        file_path = self.datasets_dir / f"{dataset_id}.parquet"
-        
-        # Save DataFrame
-        df.to_parquet(file_path, engine='pyarrow', index=False)
-        
-        # Save metadata
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO datasets (dataset_id, filename, upload_date, rows, columns, size_mb, description, file_path)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                dataset_id,
-                filename,
-                datetime.now().isoformat(),
-                len(df),
-                len(df.columns),
-                file_path.stat().st_size / (1024 * 1024),
-                description,
-                str(file_path)
-            ))
-            await db.commit()
-        
-        logger.info(f"Dataset saved: {dataset_id}")
-        return dataset_id
-    
-    async def load_dataset(self, dataset_id: str) -> Optional[pd.DataFrame]:
-        """Load dataset from storage"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT file_path FROM datasets WHERE dataset_id = ?",
-                (dataset_id,)
-            )
-            row = await cursor.fetchone()
-            
-            if row:
-                file_path = Path(row[0])
-                if file_path.exists():
-                    return pd.read_parquet(file_path)
-        
-        return None
-    
-    async def list_datasets(self) -> List[FileInfo]:
-        """List all datasets"""
-        datasets = []
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                SELECT dataset_id, filename, upload_date, rows, columns, size_mb, description
-                FROM datasets
-                ORDER BY upload_date DESC
-            """)
-            
-            async for row in cursor:
-                datasets.append(FileInfo(
-                    dataset_id=row[0],
-                    filename=row[1],
-                    upload_date=datetime.fromisoformat(row[2]),
-                    rows=row[3],
-                    columns=row[4],
-                    size_mb=row[5],
-                    description=row[6]
-                ))
-        
-        return datasets
-    
-    async def delete_dataset(self, dataset_id: str) -> bool:
-        """Delete dataset from storage"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Get file path
-            cursor = await db.execute(
-                "SELECT file_path FROM datasets WHERE dataset_id = ?",
-                (dataset_id,)
-            )
-            row = await cursor.fetchone()
-            
-            if row:
-                # Delete file
-                file_path = Path(row[0])
-                if file_path.exists():
-                    file_path.unlink()
-                
-                # Delete from database
-                await db.execute("DELETE FROM datasets WHERE dataset_id = ?", (dataset_id,))
-                await db.execute("DELETE FROM chat_history WHERE dataset_id = ?", (dataset_id,))
-                await db.commit()
-                
-                logger.info(f"Dataset deleted: {dataset_id}")
-                return True
-        
-        return False
-    
-    async def save_chat_message(self, dataset_id: str, role: str, content: str):
-        """Save chat message to history"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO chat_history (dataset_id, role, content, timestamp)
-                VALUES (?, ?, ?, ?)
-            """, (dataset_id, role, content, datetime.now().isoformat()))
-            await db.commit()
-    
-    async def get_chat_history(self, dataset_id: str) -> List[dict]:
-        """Get chat history for a dataset"""
-        messages = []
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                SELECT role, content, timestamp
-                FROM chat_history
-                WHERE dataset_id = ?
-                ORDER BY timestamp
-            """, (dataset_id,))
-            
-            async for row in cursor:
-                messages.append({
-                    "role": row[0],
-                    "content": row[1],
-                    "timestamp": row[2]
-                })
-        
-        return messages
-    
-    async def clear_chat_history(self, dataset_id: str):
-        """Clear chat history for a dataset"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("DELETE FROM chat_history WHERE dataset_id = ?", (dataset_id,))
-            await db.commit()
-    
-    async def cleanup(self):
-        """Cleanup resources"""
-        logger.info("Storage cleanup completed")
-        
-    # Add this method to the existing StorageService class
-
-    async def get_dataset_filename(self, dataset_id: str) -> Optional[str]:
-        """Get original filename for a dataset"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT filename FROM datasets WHERE dataset_id = ?",
-                (dataset_id,)
-            )
-            row = await cursor.fetchone()
-            return row[0] if row else None    
\ No newline at end of file
+import io
+import os
+import re
+import json
+import zlib
+import zipfile
+import chardet
+import openpyxl
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import logging
+
+from app.config import settings
+from app.schema.file import FileInfo
+from app.services.database import Database, database
+from app.services.dataset_cache import dataset_cache
+from app.services.profiling import pandas_dtypes, profile_parquet
+
+logger = logging.getLogger(__name__)
+
+class StorageService:
+    """Handle all storage operations using SQLite"""
+    
+    def __init__(self, db: Optional[Database] = None):
+        # Metadata goes through the shared, pooled connections
+        self.db = db or database
+        self.datasets_dir = settings.data_dir / "datasets"
+        
+    async def initialize(self):
+        """Initialize the storage system"""
+        # Create directories
+        self.datasets_dir.mkdir(exist_ok=True)
+        
+        # Initialize database
+        async with self.db.write() as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS datasets (
+                    dataset_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    upload_date TEXT NOT NULL,
+                    rows INTEGER NOT NULL,
+                    columns INTEGER NOT NULL,
+                    size_mb REAL NOT NULL,
+                    description TEXT,
+                    file_path TEXT NOT NULL,
+                    profile TEXT
+                )
+            """)
+            # Databases created before dataset profiles were added
+            columns = await db.execute_fetchall("PRAGMA table_info(datasets)")
+            if "profile" not in [column[1] for column in columns]:
+                await db.execute("ALTER TABLE datasets ADD COLUMN profile TEXT")
+            
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS chat_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dataset_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    FOREIGN KEY (dataset_id) REFERENCES datasets (dataset_id)
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chat_history_dataset ON chat_history (dataset_id, timestamp)"
+            )
+            
+        logger.info("Storage system initialized")
+    
+    def new_dataset_path(self, filename: str) -> Tuple[str, Path]:
+        """Allocate a unique dataset id and parquet path for a file"""
+        # Generate unique ID
+        dataset_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename.replace('.', '_')}"
+        file_path = self.datasets_dir / f"{dataset_id}.parquet"
+        # Concurrent jobs can save results for the same file within one second
+        base_id, suffix = dataset_id, 1
+        while file_path.exists():
+            suffix += 1
+            dataset_id = f"{base_id}_{suffix}"
+            file_path = self.datasets_dir / f"{dataset_id}.parquet"
+        return dataset_id, file_path
+    
+    async def save_dataset(self, df: pd.DataFrame, filename: str, description: Optional[str] = None) -> str:
+        """Save dataset to storage"""
+        dataset_id, file_path = self.new_dataset_path(filename)
+        
+        # Save DataFrame (in a worker thread; clustering results can be large)
+        await asyncio.to_thread(df.to_parquet, file_path, engine='pyarrow', index=False)
+        
+        await self.register_dataset(dataset_id, filename, file_path, len(df), len(df.columns), description)
+        return dataset_id
+    
+    async def register_dataset(self, dataset_id: str, filename: str, file_path: Path,
+                               rows: int, columns: int, description: Optional[str] = None):
+        """Record a dataset's parquet file, with its profile, in the metadata table"""
+        profile = await self._compute_profile(dataset_id, file_path)
+        async with self.db.write() as db:
+            await db.execute("""
+                INSERT INTO datasets (dataset_id, filename, upload_date, rows, columns, size_mb, description, file_path, profile)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                dataset_id,
+                filename,
+                datetime.now().isoformat(),
+                rows,
+                columns,
+                file_path.stat().st_size / (1024 * 1024),
+                description,
+                str(file_path),
+                json.dumps(profile) if profile else None
+            ))
+        
+        logger.info(f"Dataset saved: {dataset_id}")
+    
+    async def import_csv(self, source_path: Path, filename: str,
+                         description: Optional[str] = None) -> Tuple[str, int, int]:
+        """Convert a CSV file into a new dataset block by block, without loading it whole.
+        
+        Returns (dataset_id, rows, columns).
+        """
+        dataset_id, file_path = self.new_dataset_path(filename)
+        try:
+            rows, columns = await asyncio.to_thread(self.convert_csv, source_path, file_path)
+        except Exception:
+            file_path.unlink(missing_ok=True)
+            raise
+        
+        await self.register_dataset(dataset_id, filename, file_path, rows, columns, description)
+        return dataset_id, rows, columns
+    
+    def convert_csv(self, source_path: Path, target_path: Path) -> Tuple[int, int]:
+        """Stream a CSV into a parquet file, holding at most one row group in memory.
+        
+        Types are inferred from the first block. A later block that doesn't fit
+        (e.g. a decimal in an integer column, or values in a column that was
+        empty so far) widens that column and restarts the conversion;
+        undecodable text falls back to the next candidate encoding.
+        """
+        with open(source_path, "rb") as f:
+            sample = f.read(settings.upload_encoding_sample_size)
+        detected = chardet.detect(sample)['encoding'] or 'utf-8'
+        # A plain-ASCII prefix says nothing about the rest of the file
+        encoding = 'utf-8' if detected.lower() == 'ascii' else detected
+        encodings = list(dict.fromkeys([encoding, 'cp1252', 'latin-1']))
+        
+        column_types: Dict[str, pa.DataType] = {}
+        while True:
+            try:
+                return self._write_csv_blocks(source_path, target_path, encodings[0], column_types)
+            except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+                message = str(e)
+                failed = re.search(r"CSV column #(\d+): .*conversion error to (\w+)", message)
+                if isinstance(e, UnicodeDecodeError) or "invalid UTF8" in message:
+                    if len(encodings) == 1:
+                        raise
+                    logger.warning(f"CSV is not valid {encodings[0]}, retrying as {encodings[1]}")
+                    encodings.pop(0)
+                elif failed:
+                    name = self._csv_column_names(source_path, encodings[0])[int(failed.group(1))]
+                    column_types[name] = pa.float64() if failed.group(2) in ('int64', 'null') else pa.string()
+                    logger.info(f"CSV column '{name}' widened to {column_types[name]}")
+                else:
+                    raise
+    
+    def _csv_options(self, encoding: str, column_types: Optional[Dict[str, pa.DataType]] = None):
+        """pyarrow CSV options that read like pandas.read_csv"""
+        return dict(
+            read_options=pv.ReadOptions(encoding=encoding, block_size=settings.csv_block_size),
+            # Ticket descriptions often contain line breaks inside quotes
+            parse_options=pv.ParseOptions(newlines_in_values=True),
+            convert_options=pv.ConvertOptions(column_types=column_types or {}, strings_can_be_null=True)
+        )
+    
+    def _csv_column_names(self, source_path: Path, encoding: str) -> List[str]:
+        """Header names of a CSV"""
+        with pv.open_csv(source_path, **self._csv_options(encoding)) as reader:
+            return reader.schema.names
+    
+    def _write_csv_blocks(self, source_path: Path, target_path: Path, encoding: str,
+                          column_types: Dict[str, pa.DataType]) -> Tuple[int, int]:
+        """One conversion pass; updates column_types with the types pinned from the first block"""
+        with pv.open_csv(source_path, **self._csv_options(encoding)) as reader:
+            inferred = reader.schema
+        # Keep pandas' type set: dates and times stay text. Columns empty in the first
+        # block aren't pinned, a later block with values widens them instead
+        for field in inferred:
+            if field.name not in column_types and not (pa.types.is_integer(field.type)
+                                                       or pa.types.is_floating(field.type)
+                                                       or pa.types.is_boolean(field.type)
+                                                       or pa.types.is_null(field.type)):
+                column_types[field.name] = pa.string()
+        
+        names = self._dataframe_column_names(inferred.names)
+        rows = 0
+        row_group_bytes = settings.parquet_row_group_mb * 1024 * 1024
+        with pv.open_csv(source_path, **self._csv_options(encoding, column_types)) as reader:
+            # Columns that are empty throughout are read by pandas as float (all NaN)
+            schema = pa.schema([pa.field(name, pa.float64() if pa.types.is_null(field.type) else field.type)
+                                for field, name in zip(reader.schema, names)])
+            with pq.ParquetWriter(target_path, schema) as writer:
+                # Small CSV blocks are gathered into row groups of a useful size
+                pending, pending_bytes = [], 0
+                for batch in reader:
+                    columns = [column if column.type == field.type else column.cast(field.type)
+                               for column, field in zip(batch.columns, schema)]
+                    pending.append(pa.RecordBatch.from_arrays(columns, schema=schema))
+                    pending_bytes += batch.nbytes
+                    rows += batch.num_rows
+                    if pending_bytes >= row_group_bytes:
+                        writer.write_table(pa.Table.from_batches(pending, schema=schema))
+                        pending, pending_bytes = [], 0
+                if pending or not rows:
+                    writer.write_table(pa.Table.from_batches(pending, schema=schema))
+        return rows, len(names)
+    
+    def excel_sheet_names(self, source_path: Path) -> List[str]:
+        """Sheet names of an .xlsx file, in workbook order (without loading the workbook)"""
+        with zipfile.ZipFile(source_path) as archive:
+            workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+        return [sheet.get("name") for sheet in workbook.iter() if sheet.tag.endswith("}sheet")]
+    
+    @staticmethod
+    def resolve_sheet(sheet_names: List[str], sheet: Optional[str] = None) -> str:
+        """Pick a sheet by name or 0-based position (default: the first sheet, like pandas)"""
+        if not sheet:
+            return sheet_names[0]
+        if sheet in sheet_names:
+            return sheet
+        if sheet.isdigit() and int(sheet) < len(sheet_names):
+            return sheet_names[int(sheet)]
+        raise ValueError(f"Sheet '{sheet}' not found. Available sheets: {', '.join(sheet_names)}")
+    
+    def excel_row_groups(self, source_path: Path, target_path: Path,
+                         sheet: Optional[str] = None) -> Iterator[Tuple[int, Optional[int]]]:
+        """Convert an Excel sheet to parquet, yielding (rows written, estimated total rows) per row group.
+        
+        The sheet is read with openpyxl's read-only row iterator, so only one
+        batch of rows is held at a time. Column types are inferred per batch; if
+        a later batch needs a wider type (e.g. text in a numeric column) writing
+        continues in a new part file and the parts are merged at the end, instead
+        of parsing the workbook again.
+        """
+        workbook = openpyxl.load_workbook(source_path, read_only=True, data_only=True, keep_links=False)
+        parts: List[Path] = []
+        writer = None
+        completed = False
+        try:
+            worksheet = workbook[self.resolve_sheet(workbook.sheetnames, sheet)]
+            rows_iter = worksheet.iter_rows(values_only=True)
+            # The header is the first non-blank row
+            header = next((list(row) for row in rows_iter if any(value is not None for value in row)), [])
+            # Trailing empty header cells are formatting, not columns
+            while header and header[-1] is None:
+                header.pop()
+            if not header:
+                raise ValueError("The sheet is empty")
+            names = self._dataframe_column_names(["" if h is None else str(h) for h in header])
+            width = len(names)
+            types = [pa.null()] * width
+            estimated = worksheet.max_row - 1 if worksheet.max_row else None
+            
+            rows, batch, blank_rows = 0, [], 0
+            for row in rows_iter:
+                # Like pandas.read_excel, blank rows between data are kept but trailing ones are dropped
+                if all(value is None for value in row):
+                    blank_rows += 1
+                    continue
+                batch.extend([(None,) * width] * blank_rows)
+                blank_rows = 0
+                batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+                if len(batch) < settings.excel_batch_rows:
+                    continue
+                
+                writer = self._write_excel_batch(batch, names, types, parts, writer, target_path)
+                rows += len(batch)
+                batch = []
+                yield rows, estimated
+            
+            if batch or not rows:
+                writer = self._write_excel_batch(batch, names, types, parts, writer, target_path)
+                rows += len(batch)
+            writer.close()
+            writer = None
+            
+            # Columns that are empty throughout are read by pandas as float (all NaN), like in convert_csv
+            final_types = [pa.float64() if pa.types.is_null(t) else t for t in types]
+            if len(parts) == 1 and final_types == types:
+                os.replace(parts[0], target_path)
+            else:
+                # Earlier parts are cast to the final (widest) types while merging
+                schema = pa.schema(zip(names, final_types))
+                with pq.ParquetWriter(target_path, schema) as merged:
+                    for part in parts:
+                        part_file = pq.ParquetFile(part)
+                        for i in range(part_file.num_row_groups):
+                            merged.write_table(part_file.read_row_group(i).cast(schema))
+            completed = True
+            yield rows, rows
+        finally:
+            if writer is not None:
+                writer.close()
+            workbook.close()
+            for part in parts:
+                part.unlink(missing_ok=True)
+            if not completed:
+                target_path.unlink(missing_ok=True)
+    
+    def _write_excel_batch(self, batch: List[tuple], names: List[str], types: List[pa.DataType],
+                           parts: List[Path], writer: Optional[pq.ParquetWriter],
+                           target_path: Path) -> pq.ParquetWriter:
+        """Write one batch of sheet rows as a row group, widening types (in place) as needed"""
+        columns = list(zip(*batch)) if batch else [()] * len(names)
+        widened = [self._widen_type(current, self._excel_type(values)) for current, values in zip(types, columns)]
+        if writer is None or widened != types:
+            if writer is not None:
+                writer.close()
+            types[:] = widened
+            parts.append(settings.data_dir / "temp" / f"{target_path.stem}.part{len(parts)}.parquet")
+            writer = pq.ParquetWriter(parts[-1], pa.schema(zip(names, types)))
+        
+        arrays = [
+            pa.array([v if v is None or isinstance(v, str) else str(v) for v in values] if pa.types.is_string(t) else values, type=t)
+            for values, t in zip(columns, types)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, names=names))
+        return writer
+    
+    @staticmethod
+    def _excel_type(values) -> pa.DataType:
+        """Arrow type of a column of Excel cell values"""
+        kinds = set(map(type, values)) - {type(None)}
+        if not kinds:
+            return pa.null()
+        if kinds == {bool}:
+            return pa.bool_()
+        if kinds == {int}:
+            return pa.int64()
+        if kinds <= {int, float}:
+            return pa.float64()
+        if kinds == {datetime}:
+            return pa.timestamp("us")
+        return pa.string()
+    
+    @staticmethod
+    def _widen_type(current: pa.DataType, new: pa.DataType) -> pa.DataType:
+        """Narrowest type that holds values of both types"""
+        if current == new or pa.types.is_null(new):
+            return current
+        if pa.types.is_null(current):
+            return new
+        if {current, new} == {pa.int64(), pa.float64()}:
+            return pa.float64()
+        return pa.string()
+    
+    @staticmethod
+    def _dataframe_column_names(names: List[str]) -> List[str]:
+        """Name blank and repeated headers the way pandas.read_csv does"""
+        result, seen = [], {}
+        for i, name in enumerate(names):
+            name = name or f"Unnamed: {i}"
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            result.append(name)
+        return result
+    
+    def embeddings_path(self, dataset_id: str) -> Path:
+        """Path of the float32 embedding matrix stored next to a dataset"""
+        return self.datasets_dir / f"{dataset_id}.embeddings.npy"
+    
+    async def save_embeddings(self, dataset_id: str, embeddings: np.ndarray) -> Path:
+        """Save a dataset's embeddings as a float32 .npy sidecar (row-aligned with the dataset)"""
+        path = self.embeddings_path(dataset_id)
+        await asyncio.to_thread(np.save, path, np.ascontiguousarray(embeddings, dtype=np.float32))
+        logger.info(f"Embeddings saved for {dataset_id}: {embeddings.shape}")
+        return path
+    
+    async def load_embeddings(self, dataset_id: str) -> Optional[np.ndarray]:
+        """Load a dataset's embeddings as a read-only memory-mapped float32 matrix.
+        
+        Falls back to the legacy 'embedding' list column of older clustered datasets,
+        converting it once into a sidecar so later loads are zero-copy.
+        """
+        path = self.embeddings_path(dataset_id)
+        if path.exists():
+            return np.load(path, mmap_mode='r')
+        
+        file_path = await self.get_dataset_path(dataset_id)
+        if file_path is None or not file_path.exists():
+            return None
+        if 'embedding' not in pq.read_schema(file_path).names:
+            return None
+        
+        column = (await asyncio.to_thread(pq.read_table, file_path, columns=['embedding']))['embedding']
+        values = column.combine_chunks().flatten().to_numpy().astype(np.float32)
+        await self.save_embeddings(dataset_id, values.reshape(len(column), -1))
+        return np.load(path, mmap_mode='r')
+    
+    def vector_index_paths(self, dataset_id: str) -> Tuple[Path, Path]:
+        """Paths of a dataset's similarity index: (normalized vectors grouped by list, list metadata)"""
+        return self.datasets_dir / f"{dataset_id}.index.npy", self.datasets_dir / f"{dataset_id}.index.npz"
+    
+    def cluster_model_path(self, dataset_id: str) -> Path:
+        """Path of the cluster model (centroids, outlier radii, projection) stored next to a clustered dataset"""
+        return self.datasets_dir / f"{dataset_id}.model.npz"
+    
+    async def save_cluster_model(self, dataset_id: str, arrays: Dict[str, np.ndarray], metadata: Dict[str, Any]):
+        """Save a clustering run's fitted model so new rows can be assigned to the same clusters later"""
+        path = self.cluster_model_path(dataset_id)
+        await asyncio.to_thread(np.savez, path, **arrays)
+        path.with_suffix(".json").write_text(json.dumps(metadata), encoding="utf-8")
+        logger.info(f"Cluster model saved for {dataset_id}: {metadata.get('n_clusters')} clusters")
+    
+    async def load_cluster_model(self, dataset_id: str) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+        """Load a cluster model as (arrays, metadata), or None if the dataset has none"""
+        path = self.cluster_model_path(dataset_id)
+        if not path.exists():
+            return None
+        with np.load(path) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+        metadata = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+        return arrays, metadata
+    
+    async def get_dataset_path(self, dataset_id: str) -> Optional[Path]:
+        """Get the parquet path of a dataset"""
+        async with self.db.read() as db:
+            rows = await db.execute_fetchall(
+                "SELECT file_path FROM datasets WHERE dataset_id = ?",
+                (dataset_id,)
+            )
+        return Path(rows[0][0]) if rows else None
+    
+    async def load_dataset(self, dataset_id: str, copy: bool = True) -> Optional[pd.DataFrame]:
+        """Load dataset from storage (hot datasets come from the in-process cache).
+        
+        With copy=False the cached frame itself is returned and must not be modified.
+        """
+        file_path = await self.get_dataset_path(dataset_id)
+        if file_path is None:
+            return None
+        try:
+            mtime = file_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        
+        if not settings.dataset_cache_enabled:
+            return await asyncio.to_thread(pd.read_parquet, file_path)
+        df = await dataset_cache.get((dataset_id, mtime), lambda: asyncio.to_thread(pd.read_parquet, file_path))
+        # Callers that modify their frame (clustering, the chat agent's code) get their own copy
+        return await asyncio.to_thread(df.copy) if copy else df
+    
+    async def _compute_profile(self, dataset_id: str, file_path: Path) -> Optional[Dict[str, Any]]:
+        """Profile a dataset's parquet file; a failure only costs the profile, not the dataset"""
+        try:
+            profile = await asyncio.to_thread(profile_parquet, file_path)
+        except Exception as e:
+            logger.warning(f"Could not profile dataset {dataset_id}: {e}")
+            return None
+        logger.info(f"Dataset profiled: {dataset_id} in {profile['seconds']}s")
+        return profile
+    
+    async def get_dataset_profile(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """Get a dataset's profile (column types, nulls, distinct counts, ranges, top values).
+        
+        Datasets saved before profiles existed are profiled on first request.
+        """
+        async with self.db.read() as db:
+            rows = await db.execute_fetchall(
+                "SELECT profile, file_path FROM datasets WHERE dataset_id = ?",
+                (dataset_id,)
+            )
+        if not rows:
+            return None
+        profile, file_path = rows[0]
+        if profile:
+            return json.loads(profile)
+        
+        file_path = Path(file_path)
+        if not file_path.exists():
+            return None
+        profile = await asyncio.to_thread(profile_parquet, file_path)
+        async with self.db.write() as db:
+            await db.execute(
+                "UPDATE datasets SET profile = ? WHERE dataset_id = ?",
+                (json.dumps(profile), dataset_id)
+            )
+        logger.info(f"Dataset profiled: {dataset_id} in {profile['seconds']}s")
+        return profile
+    
+    async def get_dataset_schema(self, dataset_id: str) -> Optional[Dict[str, str]]:
+        """Column names and pandas dtypes of a dataset, read from the parquet footer"""
+        file_path = await self.get_dataset_path(dataset_id)
+        if file_path is None or not file_path.exists():
+            return None
+        return pandas_dtypes(await asyncio.to_thread(pq.read_schema, file_path))
+    
+    async def read_dataset_head(self, dataset_id: str, rows: int,
+                                columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """Read the first rows of a dataset, optionally only some columns.
+        
+        Only the row groups and column chunks needed are decoded, so the cost
+        doesn't grow with the size of the dataset.
+        """
+        file_path = await self.get_dataset_path(dataset_id)
+        if file_path is None or not file_path.exists():
+            return None
+        return await asyncio.to_thread(self._read_head, file_path, rows, columns)
+    
+    def _read_head(self, file_path: Path, rows: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        with pq.ParquetFile(file_path) as parquet:
+            schema = parquet.schema_arrow
+            names = list(pandas_dtypes(schema))
+            unknown = [column for column in columns or [] if column not in names]
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+            columns = columns or names
+            
+            batch = next(parquet.iter_batches(batch_size=rows, columns=columns), None) if rows > 0 else None
+            if batch is None:
+                table = schema.empty_table().select(columns)
+            else:
+                # Batches lose the file's pandas metadata, which restores pandas-specific dtypes
+                table = pa.Table.from_batches([batch]).replace_schema_metadata(schema.metadata)
+        return table.slice(0, rows).to_pandas()
+    
+    def iter_csv(self, file_path: Path) -> Iterator[bytes]:
+        """Encode a dataset as CSV one batch of rows at a time (same formatting as DataFrame.to_csv)"""
+        with pq.ParquetFile(file_path) as parquet:
+            metadata = parquet.schema_arrow.metadata
+            header = True
+            for batch in parquet.iter_batches(batch_size=settings.download_batch_rows):
+                # The file's pandas metadata restores the dtypes read_parquet would give
+                df = pa.Table.from_batches([batch]).replace_schema_metadata(metadata).to_pandas()
+                yield df.to_csv(index=False, header=header).encode("utf-8")
+                header = False
+            if header:
+                # No rows: just the column names
+                yield parquet.schema_arrow.empty_table().to_pandas().to_csv(index=False).encode("utf-8")
+    
+    def iter_arrow_stream(self, file_path: Path) -> Iterator[bytes]:
+        """Encode a dataset in the Arrow IPC streaming format, one record batch at a time"""
+        sink = io.BytesIO()
+        with pq.ParquetFile(file_path) as parquet:
+            with pa.ipc.new_stream(sink, parquet.schema_arrow) as writer:
+                for batch in parquet.iter_batches(batch_size=settings.download_batch_rows):
+                    writer.write_batch(batch)
+                    yield sink.getvalue()
+                    sink.seek(0)
+                    sink.truncate()
+        # Schema (when there were no batches) and end-of-stream marker
+        yield sink.getvalue()
+    
+    @staticmethod
+    def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Gzip a stream of byte chunks incrementally"""
+        compressor = zlib.compressobj(settings.download_gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    
+    async def list_datasets(self) -> List[FileInfo]:
+        """List all datasets"""
+        datasets = []
+        
+        async with self.db.read() as db:
+            rows = await db.execute_fetchall("""
+                SELECT dataset_id, filename, upload_date, rows, columns, size_mb, description
+                FROM datasets
+                ORDER BY upload_date DESC
+            """)
+            
+            for row in rows:
+                datasets.append(FileInfo(
+                    dataset_id=row[0],
+                    filename=row[1],
+                    upload_date=datetime.fromisoformat(row[2]),
+                    rows=row[3],
+                    columns=row[4],
+                    size_mb=row[5],
+                    description=row[6]
+                ))
+        
+        return datasets
+    
+    async def delete_dataset(self, dataset_id: str) -> bool:
+        """Delete dataset from storage"""
+        async with self.db.write() as db:
+            # Get file path
+            rows = await db.execute_fetchall(
+                "SELECT file_path FROM datasets WHERE dataset_id = ?",
+                (dataset_id,)
+            )
+            row = rows[0] if rows else None
+            
+            if row:
+                # Delete file
+                dataset_cache.invalidate(dataset_id)
+                # Imported here: the similarity service is built on top of storage
+                from app.services.similarity import similarity_service
+                similarity_service.invalidate(dataset_id)
+                file_path = Path(row[0])
+                if file_path.exists():
+                    file_path.unlink()
+                self.embeddings_path(dataset_id).unlink(missing_ok=True)
+                self.cluster_model_path(dataset_id).unlink(missing_ok=True)
+                self.cluster_model_path(dataset_id).with_suffix(".json").unlink(missing_ok=True)
+                for index_path in self.vector_index_paths(dataset_id):
+                    index_path.unlink(missing_ok=True)
+                
+                # Delete from database
+                await db.execute("DELETE FROM datasets WHERE dataset_id = ?", (dataset_id,))
+                await db.execute("DELETE FROM chat_history WHERE dataset_id = ?", (dataset_id,))
+                
+                logger.info(f"Dataset deleted: {dataset_id}")
+                return True
+        
+        return False
+    
+    async def save_chat_message(self, dataset_id: str, role: str, content: str):
+        """Save chat message to history"""
+        async with self.db.write() as db:
+            await db.execute("""
+                INSERT INTO chat_history (dataset_id, role, content, timestamp)
+                VALUES (?, ?, ?, ?)
+            """, (dataset_id, role, content, datetime.now().isoformat()))
+    
+    async def get_chat_history(self, dataset_id: str) -> List[dict]:
+        """Get chat history for a dataset"""
+        messages = []
+        
+        async with self.db.read() as db:
+            rows = await db.execute_fetchall("""
+                SELECT role, content, timestamp
+                FROM chat_history
+                WHERE dataset_id = ?
+                ORDER BY timestamp
+            """, (dataset_id,))
+            
+            for row in rows:
+                messages.append({
+                    "role": row[0],
+                    "content": row[1],
+                    "timestamp": row[2]
+                })
+        
+        return messages
+    
+    async def clear_chat_history(self, dataset_id: str):
+        """Clear chat history for a dataset"""
+        async with self.db.write() as db:
+            await db.execute("DELETE FROM chat_history WHERE dataset_id = ?", (dataset_id,))
+    
+    async def cleanup(self):
+        """Cleanup resources"""
+        logger.info("Storage cleanup completed")
+        
+    # Add this method to the existing StorageService class
+
+    async def get_dataset_filename(self, dataset_id: str) -> Optional[str]:
+        """Get original filename for a dataset"""
+        async with self.db.read() as db:
+            rows = await db.execute_fetchall(
+                "SELECT filename FROM datasets WHERE dataset_id = ?",
+                (dataset_id,)
+            )
+        return rows[0][0] if rows else None    
\ No newline at end of file
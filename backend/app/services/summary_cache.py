@@ -0,0 +1,72 @@
+import json
+import time
+import hashlib
+import logging
+import aiosqlite
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class SummaryCache:
+    """Persistent cache of LLM cluster summaries.
+
+    Entries are keyed by a hash of (model, prompt version, sampled records), so
+    re-running a dataset whose clusters didn't materially change reuses the
+    earlier summaries instead of calling the LLM again.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path or settings.data_dir / "cache" / "summaries.db"
+        self._initialized = False
+
+    @staticmethod
+    def make_key(model: str, prompt_version: int, records: List[Dict[str, Any]]) -> str:
+        """Build the content address of a summary request"""
+        payload = json.dumps([model, prompt_version, records], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def initialize(self):
+        """Create the cache database if needed"""
+        if self._initialized:
+            return
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    prompt_version INTEGER NOT NULL,
+                    summary TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            await db.commit()
+
+        self._initialized = True
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached summary text, or None on a miss"""
+        await self.initialize()
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("SELECT summary FROM summaries WHERE key = ?", (key,))
+            row = await cursor.fetchone()
+            if row:
+                await db.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+                await db.commit()
+        return row[0] if row else None
+
+    async def put(self, key: str, model: str, prompt_version: int, summary: str):
+        """Store a summary"""
+        await self.initialize()
+        now = time.time()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                INSERT OR REPLACE INTO summaries (key, model, prompt_version, summary, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, model, prompt_version, summary, now, now))
+            await db.commit()
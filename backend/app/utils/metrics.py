@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+COUNTERS = ("api_calls", "tokens", "retries", "cache_hits", "throttled_s", "pool_cpu_s")
+# Recorded as the largest value seen rather than a sum
+PEAKS = ("pool_peak_rss_mb",)
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_mb() -> Optional[float]:
+    """Current resident memory of this process (Linux only, None elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * PAGE_SIZE / (1024 * 1024), 1)
+
+def process_peak_rss_mb() -> Optional[float]:
+    """Lifetime high-water mark of this process's resident memory.
+
+    It covers everything the process has run since it started (every task, not
+    just the current one) and never goes down, so it says little about any one
+    stage; stages record rss_delta_mb instead.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _reset_peak_rss() -> bool:
+    """Restart this process's resident memory high-water mark (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_since_reset() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+class TaskMetrics:
+    """Per-stage wall time, CPU time, memory and API counters of one task.
+
+    Top-level stages run one after another (begin() closes the previous one);
+    nested stages (e.g. tokenization inside embedding) are timed inclusively
+    and counters go to the innermost open stage. CPU time covers the API
+    process (shared with anything else it runs concurrently) plus, as
+    pool_cpu_s, work done for the task in the compute pool.
+
+    Memory is the change in the API process's resident memory over the stage
+    (rss_delta_mb; other tasks running concurrently show up in it too) and, as
+    pool_peak_rss_mb, the highest resident memory of a compute pool worker
+    while it ran the stage's work.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        # (name, wall start, cpu start, rss start) of every open stage, outermost first
+        self._open: List[Tuple[str, float, float, Optional[float]]] = []
+        self._current = None
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    def _stage(self, name: str) -> Dict[str, float]:
+        if name not in self.stages:
+            # Counters appear once something is recorded against the stage
+            self.stages[name] = {"wall_s": 0.0, "cpu_s": 0.0}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str):
+        """Measure a block of the task as the named stage (re-entering a stage accumulates)"""
+        stage = self._stage(name)
+        entry = (name, time.perf_counter(), time.process_time(), rss_mb())
+        self._open.append(entry)
+        try:
+            yield stage
+        finally:
+            stage["wall_s"] += time.perf_counter() - entry[1]
+            stage["cpu_s"] += time.process_time() - entry[2]
+            rss = rss_mb()
+            if rss is not None and entry[3] is not None:
+                stage["rss_delta_mb"] = round(stage.get("rss_delta_mb", 0.0) + rss - entry[3], 1)
+                stage["rss_mb"] = rss
+            self._open.remove(entry)
+
+    def begin(self, name: str):
+        """End the current top-level stage and start the next one"""
+        self.end()
+        self._current = self.stage(name)
+        self._current.__enter__()
+
+    def end(self):
+        """End the current top-level stage, if any"""
+        if self._current is not None:
+            self._current.__exit__(None, None, None)
+            self._current = None
+
+    def record(self, **counters: float):
+        """Add to the counters of the innermost open stage"""
+        stage = self._stage(self._open[-1][0] if self._open else "other")
+        for counter, value in counters.items():
+            if counter in PEAKS:
+                stage[counter] = max(stage.get(counter, 0), value)
+            else:
+                stage[counter] = stage.get(counter, 0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-ready view of all stages plus task totals"""
+        stages = {name: dict(stage) for name, stage in self.stages.items()}
+        # Stages still running count up to now
+        wall, cpu = time.perf_counter(), time.process_time()
+        for name, wall_start, cpu_start, _ in self._open:
+            stages[name]["wall_s"] += wall - wall_start
+            stages[name]["cpu_s"] += cpu - cpu_start
+        stages = {
+            name: {key: round(value, 3) if isinstance(value, float) else value for key, value in stage.items()}
+            for name, stage in stages.items()
+        }
+        totals = {counter: round(sum(s.get(counter, 0) for s in self.stages.values()), 3) for counter in COUNTERS}
+        totals["wall_s"] = round(wall - self.started, 3)
+        totals["cpu_s"] = round(cpu - self.cpu_started, 3)
+        for peak in PEAKS:
+            values = [s[peak] for s in self.stages.values() if peak in s]
+            if values:
+                totals[peak] = max(values)
+        totals["rss_mb"] = rss_mb()
+        totals["process_peak_rss_mb"] = process_peak_rss_mb()
+        return {"stages": stages, "total": totals}
+
+current_metrics: ContextVar[Optional[TaskMetrics]] = ContextVar("current_metrics", default=None)
+
+@contextmanager
+def track_stage(name: str):
+    """Measure a block as a stage of the current task (no-op outside a task)"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield None
+        return
+    with metrics.stage(name) as stage:
+        yield stage
+
+def begin_stage(name: str):
+    """Move the current task on to its next top-level stage (no-op outside a task)"""
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.begin(name)
+
+def end_stage():
+    """End the current task's top-level stage (no-op outside a task)"""
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.end()
+
+def record(**counters: float):
+    """Count API calls, tokens, retries etc. against the current task's stage (no-op outside a task)"""
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.record(**counters)
+
+def timed_call(func: Callable, args: Tuple) -> Tuple[Any, float, Optional[float]]:
+    """Run func(*args) and return (result, CPU seconds spent, peak resident MB); used inside pool workers.
+
+    A worker runs one call at a time, so its memory high-water mark can be
+    restarted for each call; the peak is None where that isn't supported.
+    """
+    tracked = _reset_peak_rss()
+    cpu = time.process_time()
+    result = func(*args)
+    return result, time.process_time() - cpu, _peak_rss_since_reset() if tracked else None
@@ -0,0 +1,61 @@
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Precompiled patterns for the row-by-row cleaner
+URL_RE = re.compile(r'https?://\S+')
+LINE_BREAK_RE = re.compile(r'[\r\n\t]')
+DIGIT_WORD_RE = re.compile(r'\b\w*\d\w*\b')
+NON_ALPHA_RE = re.compile(r'[^a-z ]+')
+WHITESPACE_RE = re.compile(r'\s+')
+
+# pyarrow regex kernels run on RE2, which only agrees with Python's re on ASCII text.
+# \S is spelled out as the complement of Python's ASCII whitespace set.
+ARROW_URL_PATTERN = r'https?://[^\t\n\x0b\x0c\r\x1c-\x1f ]+'
+
+def clean_description(text) -> str:
+    """Clean a single text description"""
+    text = str(text).lower()
+    # Remove URLs
+    text = URL_RE.sub('', text)
+    # Remove line breaks / tabs
+    text = LINE_BREAK_RE.sub(' ', text)
+    # Remove words with digits (e.g. device codes)
+    text = DIGIT_WORD_RE.sub(' ', text)
+    # Remove all remaining non-alphanumerics
+    text = NON_ALPHA_RE.sub(' ', text)
+    # Collapse multiple spaces
+    text = WHITESPACE_RE.sub(' ', text).strip()
+    return text
+
+def clean_descriptions(series: pd.Series, mode: str = "vectorized") -> pd.Series:
+    """Clean a column of descriptions.
+
+    "vectorized" cleans each distinct value once with pyarrow string kernels and
+    falls back to clean_description for non-ASCII values; "apply" runs
+    clean_description row by row. Both produce identical output.
+    """
+    if mode == "apply":
+        return series.apply(clean_description)
+    if mode != "vectorized":
+        raise ValueError(f"Unknown text cleaning mode: {mode}")
+
+    codes, uniques = pd.factorize(series.astype(str))
+    raw = pa.array(uniques, type=pa.large_string())
+
+    text = pc.utf8_lower(raw)
+    text = pc.replace_substring_regex(text, ARROW_URL_PATTERN, '')
+    text = pc.replace_substring_regex(text, r'\b\w*\d\w*\b', ' ')
+    # Line breaks, leftover symbols and repeated spaces all end up as a single
+    # space in clean_description, so one pass over non-letters covers those steps
+    text = pc.replace_substring_regex(text, r'[^a-z]+', ' ')
+    text = pc.utf8_trim(text, ' ')
+    cleaned = text.to_numpy(zero_copy_only=False)
+
+    # Unicode-aware \w, \d and \s need Python's re
+    non_ascii = ~pc.string_is_ascii(raw).to_numpy(zero_copy_only=False)
+    if non_ascii.any():
+        cleaned[non_ascii] = [clean_description(value) for value in uniques[non_ascii]]
+
+    return pd.Series(cleaned[codes], index=series.index, name=series.name)
@@ -1,115 +1,148 @@
-import requests
-from typing import Optional, List, Dict
-import pandas as pd
-import io
-from config import config
-
-class APIClient:
-    """Client for backend API communication"""
-    
-    def __init__(self):
-        self.base_url = config.BACKEND_URL
-        self.session = requests.Session()
-    
-    def health_check(self) -> Dict:
-        """Check if backend is healthy"""
-        try:
-            response = self.session.get(f"{self.base_url}/api/health")
-            return response.json()
-        except:
-            return {"status": "unhealthy", "message": "Cannot connect to backend"}
-    
-    def upload_file(self, file, filename: str, description: Optional[str] = None) -> Dict:
-        """Upload a file to backend"""
-        files = {"file": (filename, file, "application/octet-stream")}
-        data = {"description": description} if description else {}
-        
-        response = self.session.post(
-            f"{self.base_url}/api/files/upload",
-            files=files,
-            data=data
-        )
-        response.raise_for_status()
-        return response.json()
-    
-    def list_files(self) -> List[Dict]:
-        """List all files"""
-        response = self.session.get(f"{self.base_url}/api/files/list")
-        response.raise_for_status()
-        return response.json()
-    
-    def preview_file(self, dataset_id: str, rows: int = 5) -> Dict:
-        """Preview a file"""
-        response = self.session.get(
-            f"{self.base_url}/api/files/{dataset_id}/preview",
-            params={"rows": rows}
-        )
-        response.raise_for_status()
-        return response.json()
-    
-    def delete_file(self, dataset_id: str) -> Dict:
-        """Delete a file"""
-        response = self.session.delete(f"{self.base_url}/api/files/{dataset_id}")
-        response.raise_for_status()
-        return response.json()
-    
-    def download_file(self, dataset_id: str) -> Dict:
-        """Download a file"""
-        response = self.session.get(f"{self.base_url}/api/files/{dataset_id}/download")
-        response.raise_for_status()
-        return response.json()
-    
-    def chat_query(self, dataset_id: str, query: str, context: Optional[str] = None) -> Dict:
-        """Send chat query"""
-        payload = {
-            "dataset_id": dataset_id,
-            "query": query,
-            "context": context
-        }
-        
-        response = self.session.post(
-            f"{self.base_url}/api/chat/query",
-            json=payload
-        )
-        response.raise_for_status()
-        return response.json()
-    
-    def get_chat_history(self, dataset_id: str) -> Dict:
-        """Get chat history"""
-        response = self.session.get(f"{self.base_url}/api/chat/history/{dataset_id}")
-        response.raise_for_status()
-        return response.json()
-    
-    def clear_chat_history(self, dataset_id: str) -> Dict:
-        """Clear chat history"""
-        response = self.session.delete(f"{self.base_url}/api/chat/history/{dataset_id}")
-        response.raise_for_status()
-        return response.json()
-    
-
-    def start_clustering(self, dataset_id: str, description_column: str, 
-                        number_column: Optional[str] = None, n_clusters: int = 0) -> Dict:
-        """Start clustering process"""
-        payload = {
-            "description_column": description_column,
-            "number_column": number_column,
-            "n_clusters": n_clusters
-        }
-        
-        response = self.session.post(
-            f"{self.base_url}/api/files/{dataset_id}/cluster",
-            json=payload
-        )
-        response.raise_for_status()
-        return response.json()
-
-    def get_clustering_status(self, task_id: str) -> Dict:
-        """Get clustering task status"""
-        response = self.session.get(
-            f"{self.base_url}/api/files/cluster/status/{task_id}"
-        )
-        response.raise_for_status()
-        return response.json()
-
-# Create global instance
+import requests
+from typing import BinaryIO, Optional, List, Dict, Iterator
+import pandas as pd
+import io
+import re
+import json
+from config import config
+
+class APIClient:
+    """Client for backend API communication"""
+    
+    def __init__(self):
+        self.base_url = config.BACKEND_URL
+        self.session = requests.Session()
+    
+    def health_check(self) -> Dict:
+        """Check if backend is healthy"""
+        try:
+            response = self.session.get(f"{self.base_url}/api/health")
+            return response.json()
+        except:
+            return {"status": "unhealthy", "message": "Cannot connect to backend"}
+    
+    def upload_file(self, file, filename: str, description: Optional[str] = None,
+                    sheet: Optional[str] = None) -> Dict:
+        """Upload a file to backend (Excel files return a task_id to follow until the import finishes)"""
+        files = {"file": (filename, file, "application/octet-stream")}
+        data = {"description": description} if description else {}
+        if sheet:
+            data["sheet"] = sheet
+        
+        response = self.session.post(
+            f"{self.base_url}/api/files/upload",
+            files=files,
+            data=data
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def list_files(self) -> List[Dict]:
+        """List all files"""
+        response = self.session.get(f"{self.base_url}/api/files/list")
+        response.raise_for_status()
+        return response.json()
+    
+    def preview_file(self, dataset_id: str, rows: int = 5, columns: Optional[List[str]] = None) -> Dict:
+        """Preview a file (optionally only some columns)"""
+        response = self.session.get(
+            f"{self.base_url}/api/files/{dataset_id}/preview",
+            params={"rows": rows, "columns": columns}
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def get_profile(self, dataset_id: str) -> Dict:
+        """Get a dataset's column profile (types, nulls, distinct counts, top values)"""
+        response = self.session.get(f"{self.base_url}/api/files/{dataset_id}/profile")
+        response.raise_for_status()
+        return response.json()
+    
+    def delete_file(self, dataset_id: str) -> Dict:
+        """Delete a file"""
+        response = self.session.delete(f"{self.base_url}/api/files/{dataset_id}")
+        response.raise_for_status()
+        return response.json()
+    
+    def download_file(self, dataset_id: str, destination: BinaryIO, format: str = "csv",
+                      compression: Optional[str] = None, chunk_size: int = 1024 * 1024) -> str:
+        """Stream a dataset into a binary file object, chunk by chunk; returns the file name"""
+        params = {"format": format, "compression": compression}
+        with self.session.get(
+            f"{self.base_url}/api/files/{dataset_id}/download",
+            params=params,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                destination.write(chunk)
+        
+        match = re.search(r'filename="?([^";]+)"?', response.headers.get("Content-Disposition", ""))
+        return match.group(1) if match else f"{dataset_id}.{format}"
+    
+    def chat_query(self, dataset_id: str, query: str, context: Optional[str] = None) -> Dict:
+        """Send chat query"""
+        payload = {
+            "dataset_id": dataset_id,
+            "query": query,
+            "context": context
+        }
+        
+        response = self.session.post(
+            f"{self.base_url}/api/chat/query",
+            json=payload
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def get_chat_history(self, dataset_id: str) -> Dict:
+        """Get chat history"""
+        response = self.session.get(f"{self.base_url}/api/chat/history/{dataset_id}")
+        response.raise_for_status()
+        return response.json()
+    
+    def clear_chat_history(self, dataset_id: str) -> Dict:
+        """Clear chat history"""
+        response = self.session.delete(f"{self.base_url}/api/chat/history/{dataset_id}")
+        response.raise_for_status()
+        return response.json()
+    
+
+    def start_clustering(self, dataset_id: str, description_column: str, 
+                        number_column: Optional[str] = None, n_clusters: int = 0) -> Dict:
+        """Start clustering process"""
+        payload = {
+            "description_column": description_column,
+            "number_column": number_column,
+            "n_clusters": n_clusters
+        }
+        
+        response = self.session.post(
+            f"{self.base_url}/api/files/{dataset_id}/cluster",
+            json=payload
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def get_clustering_status(self, task_id: str) -> Dict:
+        """Get clustering task status"""
+        response = self.session.get(
+            f"{self.base_url}/api/files/cluster/status/{task_id}"
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def stream_job_status(self, task_id: str) -> Iterator[Dict]:
+        """Yield status updates of a background task (clustering, assignment or Excel import) as the backend pushes them (Server-Sent Events)"""
+        with self.session.get(
+            f"{self.base_url}/api/files/cluster/events/{task_id}",
+            stream=True,
+            timeout=(10, 60)
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    yield json.loads(line[len("data: "):])
+
+# Create global instance
 api_client = APIClient()
\ No newline at end of file